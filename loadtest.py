@@ -0,0 +1,231 @@
+"""
+PatentChain load-testing harness.
+
+Runs many concurrent headless sessions of ``main.py`` (Streamlit's
+``AppTest`` API) against a pre-seeded ledger and reports rerun latency
+percentiles, throughput and memory growth.
+
+AppTest swaps a process-global runtime on every run, so script executions
+are serialized with a lock — much like CPU-bound reruns contending for the
+GIL in a real server. "latency" includes the time a session waited for its
+turn; "service" is the rerun itself.
+
+    python loadtest.py --sessions 50 --actions 20 --seed 2000
+    python loadtest.py --mix submit=1,search=4,explore=3,export=1 --json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+DEFAULT_MIX = "submit=1,search=4,explore=3,export=1"
+SEARCH_TERMS = ["synthetic", "software", "seed_user_3", "PAT-", "invention", "biotechnology"]
+
+def _rss_mb() -> float:
+    """Current resident set size (falls back to peak RSS off Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+_RUN_LOCK = threading.Lock()
+
+def _by_label(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"widget {label!r} not found")
+
+def seed_data_dir(data_dir: str, count: int) -> int:
+    """Mine ``count`` synthetic patents into ``data_dir``; returns the resulting height"""
+    os.environ["PATENTCHAIN_DATA_DIR"] = data_dir
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    import main  # noqa: E402 — читает PATENTCHAIN_DATA_DIR при импорте
+    ledger = main.load_ledger(main.LedgerStore(data_dir), main.PATENT_TYPES)
+    if count:
+        main.seed_ledger(ledger, count)
+        main.write_checkpoint(ledger)
+    return len(ledger["chain"].chain) - 1
+
+# ---------------
+# Session actions (set widget state; the runner opens their section and reruns)
+# ---------------
+
+def act_submit(at, rng):
+    _by_label(at.text_input, "Patent Title *").input(f"Load test invention {rng.randrange(10 ** 6)}")
+    _by_label(at.text_area, "Detailed Description *").input("Generated by loadtest.py. " * rng.randint(3, 30))
+    _by_label(at.button, "🚀 Submit Patent Application").click()
+
+def act_search(at, rng):
+    _by_label(at.text_input, "Search patents...").input(rng.choice(SEARCH_TERMS))
+
+def act_explore(at, rng):
+    if rng.random() < 0.5:
+        at.text_input(key="explorer_query").input(f"#{rng.randrange(len(at.session_state.toy_chain.chain))}")
+    elif at.text_input(key="explorer_query").value:
+        at.text_input(key="explorer_query").input("")  # назад к постраничному списку
+    else:
+        page = at.number_input(key="explorer_page")
+        page.set_value(rng.randint(1, int(page.max or 1)))
+
+def act_export(at, rng):
+    _by_label(at.selectbox, "Select Export Format").select(rng.choice(["CSV", "JSON"]))
+    _by_label(at.button, "Generate Export").click()
+
+# действие → (раздел приложения, функция)
+ACTIONS = {
+    "submit": ("📝 Submit Patent", act_submit),
+    "search": ("🔍 Search & Browse", act_search),
+    "explore": ("⛓️ Blockchain Explorer", act_explore),
+    "export": ("📤 Export Data", act_export),
+}
+
+def _rerun(at):
+    """Rerun the session's script; returns (latency incl. queueing, service time)"""
+    requested = time.perf_counter()
+    with _RUN_LOCK:
+        started = time.perf_counter()
+        at.run()
+        finished = time.perf_counter()
+    return finished - requested, finished - started
+
+def run_session(session_id: int, actions: int, mix: Dict[str, int], timeout: float,
+                samples: Dict[str, Dict[str, List[float]]], errors: Dict[str, int],
+                lock: threading.Lock):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(session_id)
+    names, weights = zip(*mix.items())
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    latency, service = _rerun(at)
+    record = [("initial", latency, service, bool(at.exception))]
+
+    for _ in range(actions):
+        name = rng.choices(names, weights)[0]
+        section, action = ACTIONS[name]
+        try:
+            # виджеты раздела существуют, только пока он открыт
+            if at.radio(key="section").value != section:
+                at.radio(key="section").set_value(section)
+                latency, service = _rerun(at)
+                record.append(("navigate", latency, service, bool(at.exception)))
+            action(at, rng)
+            latency, service = _rerun(at)
+            failed = bool(at.exception)
+        except Exception:
+            latency, service, failed = 0.0, 0.0, True
+        record.append((name, latency, service, failed))
+
+    with lock:
+        for name, latency, service, failed in record:
+            if failed:
+                errors[name] = errors.get(name, 0) + 1
+                continue
+            bucket = samples.setdefault(name, {"latency": [], "service": []})
+            bucket["latency"].append(latency)
+            bucket["service"].append(service)
+
+def run_load_test(sessions: int, actions: int, mix: Dict[str, int], concurrency: int,
+                  timeout: float) -> Dict:
+    samples: Dict[str, Dict[str, List[float]]] = {}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_session, i, actions, mix, timeout, samples, errors, lock)
+                   for i in range(sessions)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    report = {"sessions": sessions, "concurrency": concurrency, "elapsed_s": elapsed, "actions": {}}
+    total = 0
+    for name in sorted(set(samples) | set(errors)):
+        latency = sorted(samples.get(name, {}).get("latency", []))
+        service = sorted(samples.get(name, {}).get("service", []))
+        total += len(latency)
+        report["actions"][name] = {
+            "count": len(latency),
+            "errors": errors.get(name, 0),
+            "p50_ms": _percentile(latency, 50) * 1000,
+            "p95_ms": _percentile(latency, 95) * 1000,
+            "p99_ms": _percentile(latency, 99) * 1000,
+            "max_ms": (latency[-1] if latency else 0.0) * 1000,
+            "service_p50_ms": _percentile(service, 50) * 1000,
+            "service_p95_ms": _percentile(service, 95) * 1000,
+        }
+    rss_after = _rss_mb()
+    report["reruns"] = total
+    report["throughput_rps"] = total / elapsed if elapsed else 0.0
+    report["rss_mb"] = {"before": rss_before, "after": rss_after, "growth": rss_after - rss_before}
+    return report
+
+def print_report(report: Dict):
+    print(f"\nSessions: {report['sessions']} (concurrency {report['concurrency']}), "
+          f"{report['reruns']} reruns in {report['elapsed_s']:.1f}s "
+          f"→ {report['throughput_rps']:.1f} reruns/s")
+    print(f"{'action':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}{'svc p50':>10}{'svc p95':>10}")
+    for name, row in report["actions"].items():
+        print(f"{name:<10}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+              f"{row['service_p50_ms']:>10.1f}{row['service_p95_ms']:>10.1f}")
+    rss = report["rss_mb"]
+    print(f"RSS: {rss['before']:.1f} MB → {rss['after']:.1f} MB (+{rss['growth']:.1f} MB)")
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {name!r} (expected {', '.join(ACTIONS)})")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for PatentChain")
+    parser.add_argument("--sessions", type=int, default=50, help="number of simulated users")
+    parser.add_argument("--concurrency", type=int, default=None, help="sessions running at once (default: all)")
+    parser.add_argument("--actions", type=int, default=20, help="interactions per session")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="weighted action mix")
+    parser.add_argument("--seed", type=int, default=1000, help="synthetic patents to pre-seed")
+    parser.add_argument("--data-dir", default=None, help="ledger directory (default: fresh temp dir)")
+    parser.add_argument("--timeout", type=float, default=120, help="per-rerun timeout, seconds")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="patentchain_load_")
+    started = time.perf_counter()
+    height = seed_data_dir(data_dir, args.seed)
+    print(f"Ledger {data_dir}: height {height} (seeded in {time.perf_counter() - started:.1f}s)",
+          file=sys.stderr)
+
+    report = run_load_test(args.sessions, args.actions, args.mix,
+                           args.concurrency or args.sessions, args.timeout)
+    report["ledger_height"] = height
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
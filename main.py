@@ -1,13 +1,32 @@
 import streamlit as st
+import argparse
 import hashlib
+import hmac
+import base64
+import contextlib
+import os
+import threading
+import zlib
 import datetime
+import numpy as np
 import pandas as pd
 import json
+import logging
+import math
+import multiprocessing
+import queue
+import re
+import sys
 import plotly.express as px
 import time
+import urllib.parse
+import urllib.request
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict, defaultdict, deque
 from io import BytesIO
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # ============
 # PAGE CONFIG (должен быть САМЫМ ПЕРВЫМ вызовом Streamlit)
@@ -23,25 +42,82 @@ st.set_page_config(
 # Enhanced Blockchain Classes
 # ---------------
 
+# Сложность задаётся числовой целью (target): хэш блока, прочитанный как
+# 256-битное число, должен быть строго меньше target. Это даёт битовую
+# (и даже дробную) гранулярность вместо шага ×16 у «ведущих hex-нулей».
+HASH_BITS = 256
+INITIAL_DIFFICULTY_BITS = 8          # эквивалент прежних difficulty=2 (два hex-нуля)
+MIN_DIFFICULTY_BITS = 4
+MAX_DIFFICULTY_BITS = 20             # верхняя граница, чтобы майнинг в UI не зависал
+TARGET_BLOCK_TIME = 10.0             # желаемый интервал между блоками, сек
+RETARGET_INTERVAL = 10               # пересчёт цели каждые N блоков
+MAX_RETARGET_FACTOR = 4              # ограничение скачка цели за один пересчёт
+
+def bits_to_target(bits: float) -> int:
+    """Convert a difficulty in leading zero bits into a numeric target."""
+    return int(2 ** (HASH_BITS - bits))
+
+def target_to_bits(target: int) -> float:
+    """Convert a numeric target back into difficulty bits (may be fractional)."""
+    return HASH_BITS - math.log2(target)
+
+def block_work(target: int) -> int:
+    """Expected number of hashes needed to meet ``target``."""
+    return 2 ** HASH_BITS // (target + 1)
+
+# Генезис фиксирован: у всех узлов сети он должен совпадать
+GENESIS_TIMESTAMP = "2024-01-01T00:00:00"
+
+MAX_TARGET = bits_to_target(MIN_DIFFICULTY_BITS)   # самая лёгкая цель
+MIN_TARGET = bits_to_target(MAX_DIFFICULTY_BITS)   # самая тяжёлая цель
+
+# Поля данных, которые остаются в памяти (фильтры, индексы, карточки);
+# полный payload (описание и т.п.) живёт в холодном хранилище
+SUMMARY_FIELDS = (
+    "patent_id", "title", "patent_type", "priority", "status", "inventor",
+    "created_by", "is_on_blockchain", "timestamp", "verification_score",
+    "tx_type", "from_status", "to_status", "shard_tips",
+)
+
+def _search_nonce(prefix: str, target: int, start: int = 0) -> Tuple[int, str]:
+    """Find the first nonce >= ``start`` whose hash meets ``target``; returns (nonce, hash)"""
+    # Префикс (данные уже сериализованы) хэшируем один раз, перебираем только nonce
+    base = hashlib.sha256(prefix.encode())
+    nonce = start
+    while True:
+        h = base.copy()
+        h.update(str(nonce).encode())
+        digest = h.hexdigest()
+        if int(digest, 16) < target:
+            return nonce, digest
+        nonce += 1
+
 class Block:
-    def __init__(self, index, timestamp, data, previous_hash, nonce=0):
+    def __init__(self, index, timestamp, data, previous_hash, nonce=0, target=None):
         self.index = index
         # ISO 8601 — удобно для парсинга/сортировки
         self.timestamp = timestamp if isinstance(timestamp, str) else timestamp.isoformat()
+        self._store = None
+        self.payload_ref = None      # (offset, length) в payloads.bin
         self.data = data
         self.previous_hash = previous_hash
         self.nonce = nonce
-        self.hash = self.calculate_hash()
+        self.target = target if target is not None else bits_to_target(INITIAL_DIFFICULTY_BITS)
         self.merkle_root = self.calculate_merkle_root()
+        self.hash = self.calculate_hash()
 
-    def calculate_hash(self):
-        block_string = (
+    def _header_prefix(self):
+        # хэш покрывает данные через merkle_root — заголовок проверяем без тела
+        return (
             str(self.index) +
             str(self.timestamp) +
-            json.dumps(self.data, sort_keys=True) +
+            str(self.merkle_root) +
             str(self.previous_hash) +
-            str(self.nonce)
+            str(self.target)
         )
+
+    def calculate_hash(self):
+        block_string = self._header_prefix() + str(self.nonce)
         return hashlib.sha256(block_string.encode()).hexdigest()
 
     def calculate_merkle_root(self):
@@ -49,25 +125,119 @@ class Block:
         data_string = json.dumps(self.data, sort_keys=True)
         return hashlib.sha256(data_string.encode()).hexdigest()
 
-    def mine_block(self, difficulty=2):
-        """Simple proof of work mining"""
-        target = "0" * difficulty
-        # Важно: пересчитать hash после изменения previous_hash выше по стеку
-        while self.hash[:difficulty] != target:
-            self.nonce += 1
-            self.hash = self.calculate_hash()
+    @property
+    def data(self):
+        """Full payload; loaded from cold storage (via the LRU cache) when not resident"""
+        if self._data is None and self.payload_ref is not None:
+            return self._store.load_payload(self.payload_ref)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self.summary = Block.summarize(value)
+
+    @staticmethod
+    def summarize(data):
+        """Index fields kept in memory (and in blocks.jsonl) next to the payload"""
+        return {k: data[k] for k in SUMMARY_FIELDS if k in data} if data else {}
+
+    def release_payload(self, store, payload_ref):
+        """Keep only header + summary in memory; payload now lives in ``store``"""
+        self._store = store
+        self.payload_ref = payload_ref
+        self._data = None
+
+    def header_dict(self):
+        """Header fields only — enough to check linkage and proof of work"""
+        return {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "previous_hash": self.previous_hash,
+            "nonce": self.nonce,
+            "target": self.target,
+            "hash": self.hash,
+            "merkle_root": self.merkle_root,
+        }
+
+    def to_dict(self):
+        d = self.header_dict()
+        if self.payload_ref is not None:
+            d["summary"] = self.summary
+            d["payload"] = list(self.payload_ref)
+        else:
+            d["data"] = self.data
+        return d
+
+    @classmethod
+    def from_dict(cls, d, store=None):
+        """Restore a stored block as-is (hash is NOT recomputed — see is_chain_valid)"""
+        block = cls.__new__(cls)
+        block.index = d["index"]
+        block.timestamp = d["timestamp"]
+        block._store = store
+        block.payload_ref = tuple(d["payload"]) if "payload" in d else None
+        if block.payload_ref is not None:
+            block._data = None
+            block.summary = d["summary"]
+        else:
+            block.data = d.get("data")
+        block.previous_hash = d["previous_hash"]
+        block.nonce = d["nonce"]
+        block.target = d["target"]
+        block.hash = d["hash"]
+        block.merkle_root = d["merkle_root"]
+        return block
+
+    @classmethod
+    def from_header(cls, header, data=None):
+        return cls.from_dict(dict(header, data=data))
+
+    def meets_target(self):
+        """Check the block hash against the target it was mined for"""
+        return int(self.hash, 16) < self.target
+
+    def mine_block(self, target=None, search=_search_nonce):
+        """Simple proof of work mining (``search`` may hand the nonce loop to another process)"""
+        if target is not None:
+            self.target = target
+        self.nonce, self.hash = search(self._header_prefix(), self.target, self.nonce)
 
 class Blockchain:
-    def __init__(self):
-        self.difficulty = 2
+    def __init__(self, target_block_time=TARGET_BLOCK_TIME, retarget_interval=RETARGET_INTERVAL,
+                 store=None, blocks=None):
+        self.initial_target = bits_to_target(INITIAL_DIFFICULTY_BITS)
+        self.target_block_time = target_block_time
+        self.retarget_interval = retarget_interval
         self.pending_transactions = []
         self.mining_reward = 100
-        self.chain = [self.create_genesis_block()]
+        self.store = store
+        self.nonce_search = _search_nonce   # шарды подменяют на пул процессов
+        self._lock = threading.RLock()
+        # индексы для O(1) поиска: hash -> index, patent_id -> index
+        self.hash_index = {}
+        self.patent_index = {}
+        # блоки до trusted_height покрыты чекпоинтом и не перепроверяются
+        self.trusted_height = 0
+        self.trusted_hash = None
+        if blocks:
+            # восстановление из хранилища: индексы строит вызывающий код
+            self.chain = list(blocks)
+            self.total_work = sum(block_work(b.target) for b in self.chain)
+        else:
+            self.chain = []
+            self.total_work = 0
+            self._append(self.create_genesis_block())
+
+    @property
+    def difficulty(self):
+        """Difficulty (in bits) that the next block will be mined at"""
+        return target_to_bits(self.get_next_target())
 
     def create_genesis_block(self):
         genesis_block = Block(
             index=0,
-            timestamp=datetime.datetime.now().isoformat(),
+            timestamp=GENESIS_TIMESTAMP,
             data={
                 "title": "Genesis Block",
                 "description": "First block in the patent blockchain",
@@ -78,37 +248,1506 @@ class Blockchain:
                 "inventor": "System",
                 "status": "Active",
                 "priority": "Normal",
-                "timestamp": datetime.datetime.now().isoformat()
+                "timestamp": GENESIS_TIMESTAMP
             },
             previous_hash="0"
         )
-        genesis_block.mine_block(self.difficulty)
+        genesis_block.mine_block(self.initial_target)
         return genesis_block
 
     def get_latest_block(self):
         return self.chain[-1]
 
+    def target_for_height(self, height, chain=None):
+        """Target that applies to the block at ``height``.
+
+        Цель меняется только на границах RETARGET_INTERVAL: берём интервалы
+        между последними блоками окна и масштабируем предыдущую цель на
+        отношение фактического времени к ожидаемому. ``chain`` позволяет
+        проверить чужую ветку (заголовки пира) по тем же правилам.
+        """
+        chain = self.chain if chain is None else chain
+        if height == 0:
+            return self.initial_target
+        prev_target = chain[height - 1].target
+        if height % self.retarget_interval != 0:
+            return prev_target
+
+        # генезис с фиксированной датой в окно не входит
+        first = chain[max(1, height - 1 - self.retarget_interval)]
+        last = chain[height - 1]
+        if last.index <= first.index:
+            return prev_target
+        expected = self.target_block_time * (last.index - first.index)
+        actual = (_parse_iso(last.timestamp) - _parse_iso(first.timestamp)).total_seconds()
+        actual = min(max(actual, expected / MAX_RETARGET_FACTOR), expected * MAX_RETARGET_FACTOR)
+
+        # целочисленная арифметика (миллисекунды) — результат детерминирован
+        new_target = prev_target * int(actual * 1000) // int(expected * 1000)
+        return min(max(new_target, MIN_TARGET), MAX_TARGET)
+
+    def get_next_target(self):
+        return self.target_for_height(len(self.chain))
+
     def add_block(self, new_block: Block):
-        # корректно проставляем previous_hash, затем майним
-        new_block.previous_hash = self.get_latest_block().hash
-        # сброс nonce на всякий случай
-        new_block.nonce = 0
-        new_block.hash = new_block.calculate_hash()
-        new_block.mine_block(self.difficulty)
-        self.chain.append(new_block)
-
-    def is_chain_valid(self):
-        """Validate the entire blockchain"""
-        for i in range(1, len(self.chain)):
+        # лок: цепочка общая для всех сессий, майнинг+добавление атомарны
+        with self._lock:
+            new_block.index = len(self.chain)
+            # корректно проставляем previous_hash, затем майним
+            new_block.previous_hash = self.get_latest_block().hash
+            # сброс nonce на всякий случай
+            new_block.nonce = 0
+            new_block.merkle_root = new_block.calculate_merkle_root()
+            new_block.mine_block(self.get_next_target(), self.nonce_search)
+            self._append(new_block)
+
+    def _append(self, block: Block):
+        """Append a mined block, persist it and keep the lookup indexes in sync"""
+        self.chain.append(block)
+        self.total_work += block_work(block.target)
+        if self.store is not None:
+            self.store.append_block(block)
+        self.index_block(block)
+
+    def replace_tail(self, fork_height, new_blocks: List[Block]) -> List[Block]:
+        """Swap everything above ``fork_height`` for ``new_blocks`` (already validated).
+
+        Returns the dropped blocks so callers can roll back their aggregates.
+        """
+        with self._lock:
+            dropped = self.chain[fork_height + 1:]
+            for block in dropped:
+                self.hash_index.pop(block.hash, None)
+                patent_id = block.summary.get("patent_id")
+                if patent_id and self.patent_index.get(patent_id) == block.index:
+                    del self.patent_index[patent_id]
+                self.total_work -= block_work(block.target)
+            del self.chain[fork_height + 1:]
+            if self.trusted_height > fork_height:
+                self.trusted_height = fork_height
+                self.trusted_hash = self.chain[fork_height].hash
+            if self.store is not None:
+                if dropped:
+                    self.store.truncate_blocks(fork_height)
+                self.store.append_blocks(new_blocks)
+            for block in new_blocks:
+                self.chain.append(block)
+                self.total_work += block_work(block.target)
+                self.index_block(block)
+            return dropped
+
+    def work_after(self, height):
+        return sum(block_work(b.target) for b in self.chain[height + 1:])
+
+    def locator(self):
+        """Block hashes at tip, tip-1, … then exponentially sparser back to genesis"""
+        hashes, height, step = [], len(self.chain) - 1, 1
+        while height > 0:
+            hashes.append(self.chain[height].hash)
+            if len(hashes) >= 10:
+                step *= 2
+            height -= step
+        hashes.append(self.chain[0].hash)
+        return hashes
+
+    def index_block(self, block: Block):
+        self.hash_index[block.hash] = block.index
+        data = block.summary
+        # patent_index указывает на блок самой заявки, не на смены статуса
+        if data.get("patent_id") and data.get("tx_type") != TX_STATUS_CHANGE:
+            self.patent_index[data["patent_id"]] = block.index
+
+    def get_block(self, index) -> Optional[Block]:
+        if 0 <= index < len(self.chain):
+            return self.chain[index]
+        return None
+
+    def get_block_by_hash(self, block_hash) -> Optional[Block]:
+        index = self.hash_index.get(block_hash)
+        return None if index is None else self.chain[index]
+
+    def get_block_by_patent_id(self, patent_id) -> Optional[Block]:
+        index = self.patent_index.get(patent_id)
+        return None if index is None else self.chain[index]
+
+    def find_block(self, query) -> Optional[Block]:
+        """Look up a block by hash, patent ID or index ("#12" / "12")"""
+        query = (query or "").strip()
+        if not query:
+            return None
+        block = self.get_block_by_hash(query.lower()) or self.get_block_by_patent_id(query.upper())
+        if block is None and query.lstrip("#").isdigit():
+            block = self.get_block(int(query.lstrip("#")))
+        return block
+
+    def is_chain_valid(self, full=False):
+        """Validate the blockchain.
+
+        По умолчанию проверяются только блоки после последнего чекпоинта
+        (trusted_height); ``full=True`` — полная проверка от генезиса.
+        """
+        start = 1
+        if not full and self.trusted_height:
+            if self.chain[self.trusted_height].hash != self.trusted_hash:
+                return False
+            start = self.trusted_height + 1
+        for i in range(start, len(self.chain)):
             current_block = self.chain[i]
             previous_block = self.chain[i-1]
             # пересчитать и сравнить
+            if current_block.merkle_root != current_block.calculate_merkle_root():
+                return False
+            # summary хранится рядом с payload без хэша — сверяем с проверенными данными
+            if current_block.summary != Block.summarize(current_block.data):
+                return False
             if current_block.hash != current_block.calculate_hash():
                 return False
             if current_block.previous_hash != previous_block.hash:
                 return False
+            # блок должен быть добыт под цель, действовавшую на его высоте
+            if current_block.target != self.target_for_height(i):
+                return False
+            if not current_block.meets_target():
+                return False
+        return True
+
+# ---------------
+# Event Bus
+# ---------------
+
+# модуль под Streamlit исполняется как __main__ — логгер называем явно
+logger = logging.getLogger("patentchain")
+
+# Жизненный цикл патента
+EVENT_SUBMITTED = "submitted"
+EVENT_QUEUED = "queued"                      # поставлен в очередь на майнинг
+EVENT_MINED = "mined"
+EVENT_STORED_OFF_CHAIN = "stored_off_chain"
+EVENT_STATUS_CHANGED = "status_changed"
+EVENT_REVERTED = "reverted"                  # блок откатился при реорганизации
+
+NOTIFICATION_LIMIT = 50                      # размер кольцевого буфера на пользователя
+
+# Смена статуса — отдельная транзакция в цепочке (данные блоков неизменяемы)
+TX_STATUS_CHANGE = "status_change"
+STATUSES = ["Pending", "Approved", "Rejected", "Active"]
+STATUS_TRANSITIONS = {
+    "Pending": ("Approved", "Rejected"),
+    "Approved": ("Active",),
+}
+STATUS_ROLES = ("Examiner", "Admin")
+
+# Beacon — транзакция главной цепочки, фиксирующая вершины всех шардов
+TX_BEACON = "beacon"
+
+class EventBus:
+    """In-process publish/subscribe.
+
+    Обработчики вызываются синхронно в потоке издателя под общим локом,
+    поэтому подписчики могут обновлять агрегаты без собственной синхронизации.
+    Падение одного обработчика не мешает остальным.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+        self._lock = threading.RLock()
+        self.errors = deque(maxlen=20)
+
+    def subscribe(self, event_type, handler):
+        """Register ``handler(event)``; ``"*"`` receives every event"""
+        self._subscribers[event_type].append(handler)
+
+    def publish(self, event_type, **payload):
+        event = dict(payload, type=event_type, at=datetime.datetime.now())
+        with self._lock:
+            for handler in self._subscribers[event_type] + self._subscribers["*"]:
+                try:
+                    handler(event)
+                except Exception as e:
+                    # агрегаты/каталог могли разойтись с цепочкой — не молчим
+                    logger.exception("Event handler %s failed on %s", handler.__name__, event_type)
+                    self.errors.append(f"{event.get('at'):%Y-%m-%d %H:%M:%S} {event_type}: "
+                                       f"{handler.__name__}: {e!r}")
+        return event
+
+class Inbox:
+    """Bounded ring buffer of notifications with a maintained unread counter"""
+
+    def __init__(self, limit=NOTIFICATION_LIMIT):
+        self._items = deque(maxlen=limit)
+        self.unread = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, message, type="info"):
+        if len(self._items) == self._items.maxlen and not self._items[-1]["read"]:
+            self.unread -= 1   # самое старое непрочитанное вытесняется
+        self._items.appendleft({
+            "id": str(uuid.uuid4())[:8],
+            "message": message,
+            "type": type,  # info, success, warning, error
+            "timestamp": datetime.datetime.now(),
+            "read": False
+        })
+        self.unread += 1
+
+    def latest(self, n=5):
+        return [self._items[i] for i in range(min(n, len(self._items)))]
+
+    def mark_all_read(self):
+        for item in self._items:
+            item["read"] = True
+        self.unread = 0
+
+    def clear(self):
+        self._items.clear()
+        self.unread = 0
+
+def _tally(counts, patent_type, delta=1):
+    counts[patent_type] = counts.get(patent_type, 0) + delta
+
+def get_inbox(ledger, username) -> Inbox:
+    inboxes = ledger["inboxes"]
+    if username not in inboxes:
+        inboxes[username] = Inbox()
+    return inboxes[username]
+
+def wire_subscribers(ledger):
+    """Connect rollups, the patent catalog, user stats and notifications to the bus"""
+    bus = ledger["bus"]
+
+    def rollup_counts(event):
+        patent_type = event["data"].get("patent_type")
+        if event["type"] == EVENT_MINED:
+            _tally(ledger["counts_on_chain"], patent_type)
+        elif event["type"] == EVENT_REVERTED:
+            _tally(ledger["counts_on_chain"], patent_type, -1)
+        else:
+            _tally(ledger["counts_off_chain"], patent_type)
+
+    def _enqueue(patent_id, status):
+        # dict как упорядоченное множество: O(1) добавление/удаление, FIFO-порядок
+        ledger["status_queues"].setdefault(status, {})[patent_id] = None
+
+    def _dequeue(patent_id, status):
+        ledger["status_queues"].get(status, {}).pop(patent_id, None)
+
+    def index_catalog(event):
+        # материализованное текущее состояние: patent_id -> где лежит и какой статус
+        catalog, data = ledger["catalog"], event["data"]
+        patent_id = data.get("patent_id")
+        if event["type"] == EVENT_STATUS_CHANGED:
+            entry = catalog.get(patent_id)
+            # транзакция применима только к статусу, из которого она переводит
+            expected = data["to_status"] if event.get("reverted") else data["from_status"]
+            if entry is not None and entry["status"] == expected:
+                _dequeue(patent_id, entry["status"])
+                entry["status"] = event["status"]
+                _enqueue(patent_id, event["status"])
+            return
+        if event["type"] == EVENT_MINED:
+            entry = {"source": "blockchain", "block_index": event["block"].index}
+            if event.get("shard"):
+                entry["shard"] = event["shard"]
+        elif event["type"] == EVENT_STORED_OFF_CHAIN:
+            entry = {"source": "off-chain", "record_index": event["record_index"]}
+        else:
+            current = catalog.get(patent_id, {})
+            if (current.get("block_index") == event["block"].index
+                    and current.get("shard") == event.get("shard")):
+                _dequeue(patent_id, catalog.pop(patent_id)["status"])
+            return
+        entry.update(status=data.get("status", "Pending"), created_by=data.get("created_by"))
+        catalog[patent_id] = entry
+        _enqueue(patent_id, entry["status"])
+
+    def count_submission(event):
+        user = ledger["users"].get(event["data"].get("created_by"))
+        if user is not None:
+            user.patents_submitted += 1
+
+    def notify(event):
+        # только живые действия пользователей; seed/sync/replay не шумят
+        if event.get("origin") != "local":
+            return
+        data = event["data"]
+        if event["type"] != EVENT_STATUS_CHANGED:
+            inbox = get_inbox(ledger, data.get("created_by"))
+        if event["type"] == EVENT_MINED:
+            inbox.push(f"Patent {data['patent_id']} successfully recorded on blockchain!", "success")
+        elif event["type"] == EVENT_STORED_OFF_CHAIN:
+            inbox.push(f"Patent {data['patent_id']} stored off-chain", "info")
+        elif event["type"] == EVENT_STATUS_CHANGED:
+            owner = ledger["catalog"].get(data["patent_id"], {}).get("created_by")
+            get_inbox(ledger, owner).push(f"Patent {data['patent_id']} is now {event['status']}", "info")
+
+    for event_type in (EVENT_MINED, EVENT_STORED_OFF_CHAIN, EVENT_REVERTED):
+        bus.subscribe(event_type, rollup_counts)
+    for event_type in (EVENT_MINED, EVENT_STORED_OFF_CHAIN, EVENT_REVERTED, EVENT_STATUS_CHANGED):
+        bus.subscribe(event_type, index_catalog)
+    bus.subscribe(EVENT_SUBMITTED, count_submission)
+    for event_type in (EVENT_MINED, EVENT_STORED_OFF_CHAIN, EVENT_STATUS_CHANGED):
+        bus.subscribe(event_type, notify)
+
+def publish_block(bus, block, origin, reverted=False, shard=None):
+    """Publish the event a chain block stands for (patent record or status transaction).
+
+    Подписчикам хватает полей summary — payload с диска не поднимается.
+    Beacon-блоки событий не порождают.
+    """
+    data = block.summary
+    if data.get("tx_type") == TX_BEACON:
+        return
+    if data.get("tx_type") == TX_STATUS_CHANGE:
+        # откат смены статуса — это смена обратно на from_status
+        status = data["from_status"] if reverted else data["to_status"]
+        bus.publish(EVENT_STATUS_CHANGED, data=data, status=status, block=block, origin=origin,
+                    reverted=reverted)
+    else:
+        bus.publish(EVENT_REVERTED if reverted else EVENT_MINED, data=data, block=block,
+                    origin=origin, shard=shard)
+
+def _append_status_tx(ledger, tx, origin, timestamp=None) -> Block:
+    """Mine a status transaction and publish it; caller holds the main chain lock"""
+    block = Block(index=0, timestamp=timestamp or tx["timestamp"], data=tx, previous_hash="")
+    ledger["chain"].add_block(block)
+    publish_block(ledger["bus"], block, origin=origin)
+    return block
+
+def change_status(ledger, patent_id, new_status, user, reason="") -> Block:
+    """Record a status transition as a ledger transaction.
+
+    Raises PermissionError for roles other than STATUS_ROLES and ValueError
+    for unknown patents or transitions not allowed by STATUS_TRANSITIONS.
+    """
+    if user.role not in STATUS_ROLES:
+        raise PermissionError(f"{user.role} users cannot change patent status")
+    # чтение статуса, проверка перехода и майнинг — под одним локом,
+    # иначе одновременные Approve и Reject оба попадут в цепочку
+    with ledger["chain"]._lock:
+        entry = ledger["catalog"].get(patent_id)
+        if entry is None:
+            raise ValueError(f"Unknown patent {patent_id}")
+        current = entry["status"]
+        if new_status not in STATUS_TRANSITIONS.get(current, ()):
+            raise ValueError(f"Cannot move {patent_id} from {current} to {new_status}")
+        tx = {
+            "tx_type": TX_STATUS_CHANGE,
+            "patent_id": patent_id,
+            "from_status": current,
+            "to_status": new_status,
+            "changed_by": user.username,
+            "reason": reason,
+            "timestamp": datetime.datetime.now().isoformat(),
+        }
+        return _append_status_tx(ledger, tx, "local")
+
+def mine_patent(ledger, patent_data, timestamp, origin="local") -> Block:
+    """Queue, mine and append a patent block, publishing lifecycle events.
+
+    В шардированном режиме блок уходит в цепочку шарда своего типа;
+    каждые BEACON_INTERVAL блоков шардов главная цепочка получает beacon.
+    """
+    bus = ledger["bus"]
+    bus.publish(EVENT_QUEUED, data=patent_data, origin=origin)
+    shard = shard_for(ledger, patent_data.get("patent_type"))
+    blockchain = chain_for(ledger, shard)
+    block = Block(index=0, timestamp=timestamp, data=patent_data, previous_hash="")
+    # публикуем под локом цепочки: чекпоинт не увидит блок без записи в каталоге
+    with blockchain._lock:
+        blockchain.add_block(block)
+        publish_block(bus, block, origin, shard=shard)
+    if shard:
+        maybe_beacon(ledger, timestamp)
+    return block
+
+def mine_patents(ledger, items, origin="local") -> List[Block]:
+    """Mine many ``(patent_data, timestamp)`` pairs; different shards mine in parallel"""
+    groups = defaultdict(list)
+    for patent_data, timestamp in items:
+        groups[shard_for(ledger, patent_data.get("patent_type"))].append((patent_data, timestamp))
+
+    def mine_group(group):
+        return [mine_patent(ledger, patent_data, timestamp, origin) for patent_data, timestamp in group]
+
+    with ThreadPoolExecutor(max_workers=max(1, len(groups))) as pool:
+        mined = list(pool.map(mine_group, groups.values()))
+    return [block for group in mined for block in group]
+
+def remine_dropped(ledger, dropped, origin="reorg") -> List[Block]:
+    """Put transactions from blocks lost in a reorg back on top of the adopted tip.
+
+    Патент перемайнивается, если его нет в новой ветке; смена статуса —
+    если патент всё ещё в статусе from_status. Beacon'ы не переносятся.
+    """
+    remined = []
+    for old in dropped:
+        data = old.data or {}
+        patent_id = data.get("patent_id")
+        if data.get("tx_type") == TX_BEACON or not patent_id:
+            continue
+        catalog = ledger["catalog"]
+        if data.get("tx_type") != TX_STATUS_CHANGE:
+            if patent_id in catalog:
+                continue
+            remined.append(mine_patent(ledger, data, datetime.datetime.now().isoformat(), origin))
+            get_inbox(ledger, data.get("created_by")).push(
+                f"Patent {patent_id} re-recorded after a chain reorganization", "warning")
+            continue
+        with ledger["chain"]._lock:
+            if catalog.get(patent_id, {}).get("status") != data["from_status"]:
+                continue
+            remined.append(_append_status_tx(ledger, data, origin, datetime.datetime.now()))
+        get_inbox(ledger, catalog[patent_id].get("created_by")).push(
+            f"Patent {patent_id} status change to {data['to_status']} re-applied after a chain reorganization",
+            "warning")
+    return remined
+
+def store_off_chain(ledger, record, origin="local"):
+    """Append an off-chain record to the shared catalog and its on-disk log"""
+    # под локом главной цепочки, как и чекпоинт: запись, её каталог и счётчики видны только вместе
+    with ledger["chain"]._lock:
+        ledger["off_chain_list"].append(record)
+        ledger["store"].append_off_chain(record)
+        ledger["bus"].publish(EVENT_STORED_OFF_CHAIN, data=record["data"],
+                              record_index=len(ledger["off_chain_list"]) - 1, origin=origin)
+
+def get_patent_record(ledger, patent_id) -> Optional[Dict]:
+    """Current view of a patent: stored data plus location and status from the catalog"""
+    entry = ledger["catalog"].get(patent_id)
+    if entry is None:
+        return None
+    if entry["source"] == "blockchain":
+        block = chain_for(ledger, entry.get("shard")).chain[entry["block_index"]]
+        patent = dict(block.data or {})
+        patent["block_index"] = block.index
+        patent["hash"] = block.hash
+        if entry.get("shard"):
+            patent["shard"] = entry["shard"]
+        # ВАЖНО: timestamp берём из блока, если в data нет
+        patent["timestamp"] = patent.get("timestamp", block.timestamp)
+    else:
+        record = ledger["off_chain_list"][entry["record_index"]]
+        patent = dict(record["data"] or {})
+        patent["record_index"] = entry["record_index"]
+        patent["timestamp"] = record["timestamp"]
+    patent["source"] = entry["source"]
+    patent["status"] = entry["status"]
+    return patent
+
+MEMO_LIMIT = 128    # сколько производных значений держать на одну версию реестра
+
+def ledger_version(ledger) -> Tuple[str, int]:
+    """Changes whenever a block (incl. status changes) or off-chain record is added"""
+    tip_hash = ledger["chain"].get_latest_block().hash
+    if ledger.get("shards"):
+        tips = [tip_hash] + [c.get_latest_block().hash for c in ledger["shards"].values()]
+        tip_hash = hashlib.sha256("".join(tips).encode()).hexdigest()
+    return tip_hash, len(ledger["off_chain_list"])
+
+def memoize_on_version(ledger, key, compute):
+    """Derived data cached until the ledger version changes (shared by all sessions)"""
+    version = ledger_version(ledger)
+    memo = ledger["memo"]
+    if memo["version"] != version:
+        memo = ledger["memo"] = {"version": version, "values": {}}
+    values = memo["values"]
+    # словарь общий для всех сессий: другой поток может очистить его между проверкой и чтением
+    value = values.get(key)
+    if value is None:
+        if len(values) >= MEMO_LIMIT:
+            values.clear()
+        value = values[key] = compute()
+    return value
+
+# ---------------
+# Persistence & Checkpoints
+# ---------------
+
+DATA_DIR = os.environ.get("PATENTCHAIN_DATA_DIR", "patentchain_data")
+CHECKPOINT_KEY = os.environ.get("PATENTCHAIN_CHECKPOINT_KEY", "patentchain-dev-key").encode()
+CHECKPOINT_INTERVAL = 50     # чекпоинт каждые N новых блоков
+KEEP_CHECKPOINTS = 3
+PAYLOAD_CACHE_SIZE = 256     # сколько payload'ов держать в LRU-кэше
+
+class LedgerStore:
+    """Append-only block/catalog logs plus signed, compressed checkpoints.
+
+    Layout of ``data_dir``::
+
+        blocks.jsonl      — one block header + summary + payload pointer per line
+        payloads.bin      — zlib-compressed block payloads, append-only
+        offchain.jsonl    — one off-chain catalog record per line
+        checkpoints/      — checkpoint_<height>.json snapshots
+    """
+
+    def __init__(self, data_dir=DATA_DIR, key=CHECKPOINT_KEY, cache_size=PAYLOAD_CACHE_SIZE):
+        self.data_dir = data_dir
+        self.key = key
+        self.blocks_path = os.path.join(data_dir, "blocks.jsonl")
+        self.payloads_path = os.path.join(data_dir, "payloads.bin")
+        self.off_chain_path = os.path.join(data_dir, "offchain.jsonl")
+        self.checkpoint_dir = os.path.join(data_dir, "checkpoints")
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()     # payload_ref -> data, LRU
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
+    # --- cold payload storage ---
+
+    def _cache_put(self, payload_ref, data):
+        with self._cache_lock:
+            self._cache[payload_ref] = data
+            self._cache.move_to_end(payload_ref)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _write_payloads(self, blocks):
+        """Append compressed payloads; must be called under self._lock"""
+        with open(self.payloads_path, "ab") as f:
+            offset = f.tell()
+            for block in blocks:
+                data = block.data
+                blob = zlib.compress(json.dumps(data, sort_keys=True).encode())
+                f.write(blob)
+                payload_ref = (offset, len(blob))
+                offset += len(blob)
+                block.release_payload(self, payload_ref)
+                self._cache_put(payload_ref, data)
+
+    def load_payload(self, payload_ref):
+        payload_ref = tuple(payload_ref)
+        with self._cache_lock:
+            data = self._cache.get(payload_ref)
+            if data is not None:
+                self._cache.move_to_end(payload_ref)
+                return data
+        offset, length = payload_ref
+        with open(self.payloads_path, "rb") as f:
+            f.seek(offset)
+            data = json.loads(zlib.decompress(f.read(length)))
+        self._cache_put(payload_ref, data)
+        return data
+
+    # --- append-only logs ---
+
+    def _append_line(self, path, obj):
+        line = json.dumps(obj, sort_keys=True)
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def _read_lines(self, path):
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # недописанная последняя строка после падения — пропускаем
+                    break
+        return records
+
+    def append_block(self, block: Block):
+        self.append_blocks([block])
+
+    def append_blocks(self, blocks: List[Block]):
+        if not blocks:
+            return
+        with self._lock:
+            # осиротевшие после реорга payload'ы остаются в файле — он только растёт
+            self._write_payloads([b for b in blocks if b.payload_ref is None])
+            chunk = "".join(json.dumps(b.to_dict(), sort_keys=True) + "\n" for b in blocks)
+            with open(self.blocks_path, "a", encoding="utf-8") as f:
+                f.write(chunk)
+
+    def truncate_blocks(self, height):
+        """Keep blocks 0..height on disk (used on reorg) and drop newer checkpoints"""
+        with self._lock:
+            with open(self.blocks_path, encoding="utf-8") as f:
+                kept = [line for _, line in zip(range(height + 1), f)]
+            tmp_path = self.blocks_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.blocks_path)
+        for path in self._checkpoint_files():
+            if int(os.path.basename(path)[len("checkpoint_"):-len(".json")]) > height:
+                os.remove(path)
+
+    def load_blocks(self) -> List[Block]:
+        return [Block.from_dict(d, store=self) for d in self._read_lines(self.blocks_path)]
+
+    def append_off_chain(self, record):
+        self._append_line(self.off_chain_path, record)
+
+    def load_off_chain(self) -> List[Dict]:
+        return self._read_lines(self.off_chain_path)
+
+    # --- checkpoints ---
+
+    def _sign(self, height, tip_hash, payload: bytes) -> str:
+        msg = f"{height}:{tip_hash}:".encode() + payload
+        return hmac.new(self.key, msg, hashlib.sha256).hexdigest()
+
+    def write_checkpoint(self, height, tip_hash, state) -> str:
+        payload = zlib.compress(json.dumps(state, sort_keys=True, default=str).encode())
+        envelope = {
+            "format": 1,
+            "height": height,
+            "tip_hash": tip_hash,
+            "created_at": datetime.datetime.now().isoformat(),
+            "payload": base64.b64encode(payload).decode(),
+            "signature": self._sign(height, tip_hash, payload),
+        }
+        path = os.path.join(self.checkpoint_dir, f"checkpoint_{height:08d}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(envelope, f)
+        os.replace(tmp_path, path)  # атомарно: читатель не увидит полупустой файл
+
+        for old in self._checkpoint_files()[:-KEEP_CHECKPOINTS]:
+            os.remove(old)
+        return path
+
+    def _checkpoint_files(self):
+        names = sorted(n for n in os.listdir(self.checkpoint_dir)
+                       if n.startswith("checkpoint_") and n.endswith(".json"))
+        return [os.path.join(self.checkpoint_dir, n) for n in names]
+
+    def load_latest_checkpoint(self) -> Optional[Dict]:
+        """Return the newest checkpoint whose signature verifies, or None"""
+        for path in reversed(self._checkpoint_files()):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    envelope = json.load(f)
+                payload = base64.b64decode(envelope["payload"])
+                expected = self._sign(envelope["height"], envelope["tip_hash"], payload)
+                if not hmac.compare_digest(expected, envelope["signature"]):
+                    continue
+                envelope["state"] = json.loads(zlib.decompress(payload))
+                return envelope
+            except (OSError, ValueError, KeyError, zlib.error):
+                continue
+        return None
+
+def write_checkpoint(ledger) -> str:
+    """Snapshot tip, aggregates, indexes and catalog size; trust everything up to the tip.
+
+    Raises ValueError if the blocks since the last checkpoint do not validate.
+    """
+    blockchain = ledger["chain"]
+    with contextlib.ExitStack() as locks:
+        # главная цепочка, затем шарды — тот же порядок, что у beacon
+        for _, chain in all_chains(ledger):
+            locks.enter_context(chain._lock)
+        # доверие выдаётся только проверенному диапазону (после trusted_height)
+        if not is_ledger_valid(ledger):
+            raise ValueError("Ledger failed validation since the last checkpoint; checkpoint not written")
+        tip = blockchain.get_latest_block()
+        # снимок копиями: сериализация не должна видеть словари, которые меняют другие потоки
+        state = {
+            "counts_on_chain": dict(ledger["counts_on_chain"]),
+            "counts_off_chain": dict(ledger["counts_off_chain"]),
+            "off_chain_count": len(ledger["off_chain_list"]),
+            "hash_index": dict(blockchain.hash_index),
+            "patent_index": dict(blockchain.patent_index),
+            "catalog": {pid: dict(entry) for pid, entry in ledger["catalog"].items()},
+            "status_queues": {k: list(v) for k, v in ledger["status_queues"].items()},
+            "shards": {name: {"height": chain.get_latest_block().index, "hash": chain.get_latest_block().hash}
+                       for name, chain in ledger["shards"].items()},
+        }
+        path = ledger["store"].write_checkpoint(tip.index, tip.hash, state)
+        for _, chain in all_chains(ledger):
+            chain.trusted_height = chain.get_latest_block().index
+            chain.trusted_hash = chain.get_latest_block().hash
+    return path
+
+def maybe_checkpoint(ledger):
+    pending = sum(len(chain.chain) - 1 - chain.trusted_height for _, chain in all_chains(ledger))
+    if pending >= CHECKPOINT_INTERVAL:
+        try:
+            write_checkpoint(ledger)
+        except ValueError:
+            pass  # повреждённый хвост не становится доверенным; видно в System Info
+
+def seed_ledger(ledger, count):
+    """Mine ``count`` synthetic patents (for demos, replication and load tests).
+
+    Метки времени идут с шагом target_block_time, чтобы ретаргет не
+    задирал сложность при пакетном майнинге.
+    """
+    blockchain = ledger["chain"]
+    step = datetime.timedelta(seconds=blockchain.target_block_time)
+    # заканчиваем «сейчас», чтобы записи попадали в фильтры по датам
+    start = datetime.datetime.now() - step * count
+    last = _parse_iso(blockchain.get_latest_block().timestamp)
+    items = []
+    for i in range(count):
+        last = max(last + step, start + step * i)
+        ts = last.isoformat()
+        patent_type = PATENT_TYPES[i % len(PATENT_TYPES)]
+        data = {
+            "patent_id": generate_patent_id(),
+            "title": f"Synthetic invention #{len(blockchain.chain) + i}",
+            "description": f"Seeded {patent_type.lower()} record used for testing the ledger.",
+            "inventor": f"seed_user_{i % 25}",
+            "patent_type": patent_type,
+            "priority": ["Low", "Normal", "High", "Critical"][i % 4],
+            "doc_hash": hashlib.sha256(str(i).encode()).hexdigest(),
+            "is_on_blockchain": True,
+            "status": "Pending",
+            "created_by": "seed",
+            "timestamp": ts,
+        }
+        data["verification_score"] = verify_patent_authenticity(data)
+        items.append((data, ts))
+    # пачками по CHECKPOINT_INTERVAL: шарды внутри пачки майнятся параллельно
+    for offset in range(0, count, CHECKPOINT_INTERVAL):
+        mine_patents(ledger, items[offset:offset + CHECKPOINT_INTERVAL], origin="seed")
+        maybe_checkpoint(ledger)
+
+def load_ledger(store: LedgerStore, patent_types) -> Dict:
+    """Restore the ledger from disk, verifying only blocks after the latest checkpoint"""
+    started = time.perf_counter()
+    blocks = store.load_blocks()
+    off_chain_list = store.load_off_chain()
+
+    if not blocks:
+        blockchain = Blockchain(store=store)   # свежий реестр: генезис сразу пишется на диск
+        checkpoint = None
+    else:
+        blockchain = Blockchain(store=store, blocks=blocks)
+        checkpoint = store.load_latest_checkpoint()
+        # чекпоинт годится, только если его tip совпадает с блоком на диске
+        if checkpoint and not (checkpoint["height"] < len(blocks)
+                               and blocks[checkpoint["height"]].hash == checkpoint["tip_hash"]):
+            checkpoint = None
+
+    shard_of, shards, mining_pool = load_shards(store, patent_types)
+    # …и если вершины шардов из чекпоинта всё ещё на месте
+    shard_tips = checkpoint["state"].get("shards", {}) if checkpoint else {}
+    for name, tip in shard_tips.items():
+        chain = shards.get(name)
+        if chain is None or tip["height"] >= len(chain.chain) or chain.chain[tip["height"]].hash != tip["hash"]:
+            checkpoint, shard_tips = None, {}
+            break
+
+    ledger = {
+        "chain": blockchain,
+        "store": store,
+        "off_chain_list": [],
+        "counts_on_chain": {ptype: 0 for ptype in patent_types},
+        "counts_off_chain": {ptype: 0 for ptype in patent_types},
+        "catalog": {},
+        "status_queues": {},
+        "scores": {},
+        "bus": EventBus(),
+        "users": {
+            "demo_user": User("demo_user", "Inventor"),
+            "examiner1": User("examiner1", "Examiner"),
+            "admin": User("admin", "Admin")
+        },
+        "inboxes": {},
+        "memo": {"version": None, "values": {}},
+        "shards": shards,
+        "shard_of": shard_of,
+        "mining_pool": mining_pool,
+    }
+    ledger["beacon"] = latest_beacon_tips(blockchain)
+    wire_subscribers(ledger)
+
+    height, off_chain_seen = 0, 0
+    if checkpoint:
+        state = checkpoint["state"]
+        height = checkpoint["height"]
+        off_chain_seen = state["off_chain_count"]
+        blockchain.hash_index = dict(state["hash_index"])
+        blockchain.patent_index = dict(state["patent_index"])
+        ledger["counts_on_chain"].update(state["counts_on_chain"])
+        ledger["counts_off_chain"].update(state["counts_off_chain"])
+        ledger["catalog"].update(state["catalog"])
+        ledger["status_queues"].update({k: dict.fromkeys(v) for k, v in state["status_queues"].items()})
+        ledger["off_chain_list"].extend(off_chain_list[:off_chain_seen])
+        blockchain.trusted_height = height
+        blockchain.trusted_hash = checkpoint["tip_hash"]
+    elif blocks:
+        blockchain.index_block(blockchain.chain[0])
+
+    # хвост после чекпоинта проигрываем через шину — подписчики обновятся сами;
+    # шарды и оффчейн раньше главной цепочки: смены статуса ссылаются на их патенты
+    bus = ledger["bus"]
+    for record in off_chain_list[off_chain_seen:]:
+        ledger["off_chain_list"].append(record)
+        bus.publish(EVENT_STORED_OFF_CHAIN, data=record.get("data", {}),
+                    record_index=len(ledger["off_chain_list"]) - 1, origin="replay")
+    shard_verified = 0
+    for name, chain in shards.items():
+        shard_height = shard_tips[name]["height"] if name in shard_tips else 0
+        if shard_height:
+            chain.trusted_height = shard_height
+            chain.trusted_hash = chain.chain[shard_height].hash
+        for block in chain.chain[shard_height + 1:]:
+            publish_block(bus, block, origin="replay", shard=name)
+        shard_verified += len(chain.chain) - 1 - shard_height
+    for block in blockchain.chain[height + 1:]:
+        blockchain.index_block(block)
+        publish_block(bus, block, origin="replay")
+
+    ledger["status"] = {
+        "checkpoint_height": height if checkpoint else None,
+        "verified_blocks": len(blockchain.chain) - 1 - height + shard_verified,
+        "load_seconds": time.perf_counter() - started,
+        "valid_on_load": is_ledger_valid(ledger),
+    }
+    return ledger
+
+# ---------------
+# Sharded Ledgers
+# ---------------
+
+# "" — одна цепочка; "type" — шард на каждый тип патента;
+# "hardware=Utility Patent|Design Patent;bio=Biotechnology Patent|Chemical Patent" — группы
+SHARD_SPEC = os.environ.get("PATENTCHAIN_SHARDS", "")
+BEACON_INTERVAL = 10        # beacon в главной цепочке после N новых блоков в шардах
+MINING_WORKERS = int(os.environ.get("PATENTCHAIN_MINING_WORKERS", str(os.cpu_count() or 1)))
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+def parse_shard_spec(spec, patent_types) -> Dict[str, str]:
+    """Map patent type -> shard name; types left out of named groups go to ``other``"""
+    spec = (spec or "").strip()
+    if not spec:
+        return {}
+    if spec == "type":
+        return {patent_type: _slug(patent_type) for patent_type in patent_types}
+    shard_of = {}
+    for group in spec.split(";"):
+        name, sep, types = group.partition("=")
+        if not sep or not _slug(name):
+            raise ValueError(f"Bad shard group {group!r}, expected name=Type A|Type B")
+        for patent_type in (t.strip() for t in types.split("|")):
+            if patent_type not in patent_types:
+                raise ValueError(f"Unknown patent type {patent_type!r} in shard {name.strip()!r}")
+            shard_of[patent_type] = _slug(name)
+    for patent_type in patent_types:
+        shard_of.setdefault(patent_type, "other")
+    return shard_of
+
+def shard_for(ledger, patent_type) -> Optional[str]:
+    """Shard a new patent of this type goes to (None — the main chain)"""
+    return ledger["shard_of"].get(patent_type)
+
+def chain_for(ledger, shard) -> Blockchain:
+    return ledger["shards"][shard] if shard else ledger["chain"]
+
+def all_chains(ledger) -> List[Tuple[Optional[str], Blockchain]]:
+    return [(None, ledger["chain"])] + list(ledger["shards"].items())
+
+def _mining_worker(conn):
+    """Nonce-search loop of a MiningPool process"""
+    while True:
+        try:
+            prefix, target, start = conn.recv()
+        except (EOFError, OSError):
+            return
+        conn.send(_search_nonce(prefix, target, start))
+
+class MiningPool:
+    """Worker processes running nonce searches, so shards mine on separate cores.
+
+    Процессы запускаются через forkserver (fork уже многопоточного процесса
+    с HTTP-серверами небезопасен) и получают по каналу только данные
+    (prefix, target, start). Пул живёт в ledger — один на процесс сервера.
+    """
+
+    def __init__(self, workers=MINING_WORKERS):
+        context = multiprocessing.get_context("forkserver")
+        self.workers = workers
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            parent_conn, child_conn = context.Pipe()
+            context.Process(target=_mining_worker, args=(child_conn,), daemon=True).start()
+            child_conn.close()
+            self._idle.put(parent_conn)
+
+    def search(self, prefix, target, start=0):
+        if self.workers <= 0:
+            return _search_nonce(prefix, target, start)
+        conn = self._idle.get()     # ждём свободный процесс
+        try:
+            conn.send((prefix, target, start))
+            result = conn.recv()
+        except (EOFError, OSError):
+            self.workers -= 1       # процесс умер — соединение выбрасываем, считаем сами
+            return _search_nonce(prefix, target, start)
+        self._idle.put(conn)
+        return result
+
+def load_shards(store: LedgerStore, patent_types, spec=SHARD_SPEC):
+    """Open shard chains — configured ones plus any already on disk; returns (shard_of, shards, pool).
+
+    Each shard is a full Blockchain with its own LedgerStore under
+    ``<data_dir>/shards/<name>/`` and its own difficulty and lock.
+    """
+    shard_of = parse_shard_spec(spec, patent_types)
+    shards_dir = os.path.join(store.data_dir, "shards")
+    names = list(dict.fromkeys(shard_of.values()))
+    if os.path.isdir(shards_dir):
+        # шарды, оставшиеся от прежней конфигурации, читаются как есть
+        names += sorted(n for n in os.listdir(shards_dir) if n not in names)
+    pool = None
+    if names and MINING_WORKERS > 1 and "forkserver" in multiprocessing.get_all_start_methods():
+        pool = MiningPool(MINING_WORKERS)
+    shards = {}
+    for name in names:
+        shard_store = LedgerStore(os.path.join(shards_dir, name), key=store.key)
+        blocks = shard_store.load_blocks()
+        if blocks:
+            chain = Blockchain(store=shard_store, blocks=blocks)
+            for block in chain.chain:
+                chain.index_block(block)
+        else:
+            chain = Blockchain(store=shard_store)
+        if pool is not None:
+            chain.nonce_search = pool.search
+        shards[name] = chain
+    return shard_of, shards, pool
+
+def latest_beacon_tips(blockchain) -> Dict[str, Dict]:
+    for block in reversed(blockchain.chain):
+        if block.summary.get("tx_type") == TX_BEACON:
+            return block.summary["shard_tips"]
+    return {}
+
+def mine_beacon(ledger, timestamp=None) -> Block:
+    """Commit every shard tip (height + hash) to the main chain"""
+    blockchain = ledger["chain"]
+    with blockchain._lock:
+        tips = {name: {"height": chain.get_latest_block().index, "hash": chain.get_latest_block().hash}
+                for name, chain in ledger["shards"].items()}
+        # время главной цепочки не идёт назад, даже если шарды майнили вразнобой
+        ts = max(timestamp or datetime.datetime.now().isoformat(), blockchain.get_latest_block().timestamp)
+        block = Block(index=0, timestamp=ts, data={"tx_type": TX_BEACON, "shard_tips": tips, "timestamp": ts},
+                      previous_hash="")
+        blockchain.add_block(block)
+        ledger["beacon"] = tips
+    return block
+
+def shard_blocks_since_beacon(ledger) -> int:
+    committed = ledger["beacon"]
+    return sum(len(chain.chain) - 1 - committed.get(name, {}).get("height", 0)
+               for name, chain in ledger["shards"].items())
+
+def maybe_beacon(ledger, timestamp=None) -> Optional[Block]:
+    with ledger["chain"]._lock:
+        if shard_blocks_since_beacon(ledger) >= BEACON_INTERVAL:
+            return mine_beacon(ledger, timestamp)
+    return None
+
+def beacons_valid(ledger) -> bool:
+    """Every beacon must point at blocks still present in its shards, heights never decreasing"""
+    shards = ledger["shards"]
+    if not shards:
+        return True
+    committed = {}
+    for block in ledger["chain"].chain:
+        if block.summary.get("tx_type") != TX_BEACON:
+            continue
+        for name, tip in block.summary["shard_tips"].items():
+            chain = shards.get(name)
+            if (chain is None or tip["height"] < committed.get(name, 0)
+                    or tip["height"] >= len(chain.chain) or chain.chain[tip["height"]].hash != tip["hash"]):
+                return False
+            committed[name] = tip["height"]
+    return True
+
+def is_ledger_valid(ledger, full=False) -> bool:
+    """Main chain, every shard and the beacon commitments between them"""
+    return all(chain.is_chain_valid(full) for _, chain in all_chains(ledger)) and beacons_valid(ledger)
+
+def shard_stats(ledger) -> List[Dict]:
+    committed = ledger["beacon"]
+    rows = []
+    for name, chain in ledger["shards"].items():
+        tip = chain.get_latest_block()
+        types = [t for t, shard in ledger["shard_of"].items() if shard == name]
+        rows.append({
+            "shard": name,
+            "patent_types": ", ".join(types) or "—",
+            "blocks": len(chain.chain),
+            "patents": len(chain.chain) - 1,
+            "difficulty_bits": round(chain.difficulty, 2),
+            "valid": chain.is_chain_valid(),
+            "beacon_height": committed.get(name, {}).get("height", 0),
+            "tip_hash": tip.hash,
+        })
+    return rows
+
+# ---------------
+# Node Replication
+# ---------------
+
+NODE_HOST = os.environ.get("PATENTCHAIN_NODE_HOST", "127.0.0.1")
+NODE_PORT = int(os.environ.get("PATENTCHAIN_NODE_PORT", "0"))   # 0 — репликация выключена
+PEERS = [p.strip().rstrip("/") for p in os.environ.get("PATENTCHAIN_PEERS", "").split(",") if p.strip()]
+HEADER_BATCH = 2000
+BODY_BATCH = 1000
+NODE_TIMEOUT = 10
+
+def _http_json(url, payload=None, timeout=NODE_TIMEOUT):
+    """GET (payload is None) or POST JSON and decode the JSON response"""
+    body = None if payload is None else json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+class _NodeRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # не засоряем вывод Streamlit access-логами
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        node = self.server.node
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == "/status":
+            self._send_json(node.status())
+        elif url.path == "/bodies":
+            try:
+                start = int(query.get("from", ["0"])[0])
+                count = min(int(query.get("count", [BODY_BATCH])[0]), BODY_BATCH)
+            except ValueError:
+                self._send_json({"error": "from and count must be integers"}, 400)
+                return
+            self._send_json({"bodies": node.bodies(start, count)})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        node = self.server.node
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        if not isinstance(payload, dict):
+            self._send_json({"error": "expected a JSON object"}, 400)
+            return
+        if self.path == "/headers":
+            locator = payload.get("locator", [])
+            try:
+                count = min(int(payload.get("count", HEADER_BATCH)), HEADER_BATCH)
+            except (TypeError, ValueError):
+                count = None
+            if count is None or not isinstance(locator, list) or not all(isinstance(h, str) for h in locator):
+                self._send_json({"error": "expected {locator: [hash, ...], count: int}"}, 400)
+                return
+            self._send_json(node.headers_after(locator, count))
+        elif self.path == "/announce":
+            if not isinstance(payload.get("url", ""), str) or not isinstance(payload.get("total_work", 0), int):
+                self._send_json({"error": "expected {url: str, total_work: int}"}, 400)
+                return
+            node.on_announce(payload)
+            self._send_json({"ok": True})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+class LedgerNode:
+    """Replicates one ledger with peer nodes over local HTTP.
+
+    Protocol (JSON):
+        GET  /status                   — height, tip hash, total work
+        POST /headers {locator, count} — headers after the first locator hash the peer knows
+        GET  /bodies?from=H&count=N    — block data for heights H..H+N-1
+        POST /announce {url, …}        — a peer has a new tip; pull from it if it has more work
+
+    Sync is headers-first: the whole branch of headers is fetched and checked
+    (linkage, proof of work, retarget rule), the branch is compared by total
+    work, and only then are bodies fetched in batches and matched to their
+    Merkle roots.
+    """
+
+    def __init__(self, ledger, host=NODE_HOST, port=NODE_PORT, peers=None):
+        if ledger["shards"]:
+            # реплицируется только главная цепочка, а её beacon'ы ссылаются на блоки шардов
+            raise ValueError("Replication syncs the main chain only and cannot run on a sharded ledger")
+        self.ledger = ledger
+        self.blockchain = ledger["chain"]
+        self.peers = list(peers or [])
+        self.server = ThreadingHTTPServer((host, port), _NodeRequestHandler)
+        self.server.daemon_threads = True
+        self.server.node = self
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.last_sync = None
+        self._sync_lock = threading.Lock()
+        ledger["bus"].subscribe(EVENT_MINED, self._on_mined)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- server side ---
+
+    def status(self):
+        tip = self.blockchain.get_latest_block()
+        return {"url": self.url, "height": tip.index, "tip_hash": tip.hash,
+                "total_work": self.blockchain.total_work}
+
+    def headers_after(self, locator, count):
+        for block_hash in locator:
+            height = self.blockchain.hash_index.get(block_hash)
+            if height is not None:
+                break
+        else:
+            return {"fork_height": -1, "headers": []}   # нет общего генезиса
+        window = self.blockchain.chain[height + 1:height + 1 + count]
+        return {"fork_height": height, "headers": [b.header_dict() for b in window]}
+
+    def bodies(self, start, count):
+        window = self.blockchain.chain[max(0, start):max(0, start) + count]
+        return [{"hash": b.hash, "data": b.data} for b in window]
+
+    def on_announce(self, payload):
+        peer_url = (payload.get("url") or "").rstrip("/")
+        if not peer_url or peer_url == self.url:
+            return
+        if peer_url not in self.peers:
+            self.peers.append(peer_url)
+        if payload.get("total_work", 0) > self.blockchain.total_work:
+            threading.Thread(target=self._safe_sync, args=(peer_url,), daemon=True).start()
+
+    def _on_mined(self, event):
+        # о своих блоках сообщаем сразу; после sync анонс делается один раз
+        if event.get("origin") in ("local", "seed"):
+            self.announce()
+
+    # --- client side ---
+
+    def announce(self):
+        """Tell every peer about our tip (fire-and-forget)"""
+        status = self.status()
+        for peer_url in list(self.peers):
+            threading.Thread(target=self._post_quietly, args=(peer_url + "/announce", status),
+                             daemon=True).start()
+
+    @staticmethod
+    def _post_quietly(url, payload):
+        try:
+            _http_json(url, payload)
+        except (OSError, ValueError):
+            pass  # пир недоступен — догонит при следующем sync
+
+    def _safe_sync(self, peer_url):
+        try:
+            return self.sync_from(peer_url)
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def sync_all(self):
+        return sum(self._safe_sync(peer_url) for peer_url in list(self.peers))
+
+    def _headers_valid(self, fork_height, headers):
+        view = self.blockchain.chain[:fork_height + 1] + headers
+        for height in range(fork_height + 1, len(view)):
+            header = view[height]
+            if header.index != height or header.previous_hash != view[height - 1].hash:
+                return False
+            if header.hash != header.calculate_hash() or not header.meets_target():
+                return False
+            if header.target != self.blockchain.target_for_height(height, view):
+                return False
         return True
 
+    def sync_from(self, peer_url):
+        """Catch up from one peer; returns the number of blocks adopted"""
+        with self._sync_lock:
+            peer = _http_json(peer_url + "/status")
+            if peer["total_work"] <= self.blockchain.total_work:
+                return 0
+
+            # 1. заголовки пачками по HEADER_BATCH
+            response = _http_json(peer_url + "/headers",
+                                  {"locator": self.blockchain.locator(), "count": HEADER_BATCH})
+            fork_height = response["fork_height"]
+            if fork_height < 0:
+                return 0
+            headers = [Block.from_header(h) for h in response["headers"]]
+            while len(response["headers"]) == HEADER_BATCH:
+                response = _http_json(peer_url + "/headers",
+                                      {"locator": [headers[-1].hash], "count": HEADER_BATCH})
+                headers.extend(Block.from_header(h) for h in response["headers"])
+
+            # локатор разреженный — отрезаем уже известный общий префикс
+            chain = self.blockchain.chain
+            while (headers and fork_height + 1 < len(chain)
+                   and chain[fork_height + 1].hash == headers[0].hash):
+                fork_height += 1
+                headers.pop(0)
+            if not headers or not self._headers_valid(fork_height, headers):
+                return 0
+
+            # 2. правило наибольшей работы
+            branch_work = sum(block_work(h.target) for h in headers)
+            if branch_work <= self.blockchain.work_after(fork_height):
+                return 0
+
+            # 3. тела пачками по BODY_BATCH, каждое сверяем с merkle_root заголовка
+            for start in range(0, len(headers), BODY_BATCH):
+                batch = headers[start:start + BODY_BATCH]
+                bodies = _http_json(f"{peer_url}/bodies?from={batch[0].index}&count={len(batch)}")["bodies"]
+                if len(bodies) != len(batch):
+                    return 0
+                for header, body in zip(batch, bodies):
+                    header.data = body["data"]
+                    if body["hash"] != header.hash or header.calculate_merkle_root() != header.merkle_root:
+                        return 0
+
+            # 4. вклейка под локом цепочки (локальный майнинг мог сдвинуть tip)
+            with self.blockchain._lock:
+                chain = self.blockchain.chain
+                if fork_height >= len(chain) or chain[fork_height].hash != headers[0].previous_hash:
+                    return 0
+                if branch_work <= self.blockchain.work_after(fork_height):
+                    return 0
+                dropped = self.blockchain.replace_tail(fork_height, headers)
+                bus = self.ledger["bus"]
+                for block in reversed(dropped):
+                    publish_block(bus, block, origin="sync", reverted=True)
+                for block in headers:
+                    publish_block(bus, block, origin="sync")
+            # выпавшие из цепочки записи не теряем — перемайниваем поверх нового tip
+            remined = remine_dropped(self.ledger, dropped)
+
+            self.last_sync = {"peer": peer_url, "adopted": len(headers), "dropped": len(dropped),
+                              "remined": len(remined), "at": datetime.datetime.now().isoformat()}
+        maybe_checkpoint(self.ledger)
+        self.announce()   # госсип: пусть отстающие пиры подтянутся к нам
+        return len(headers)
+
+def run_node(argv):
+    """Headless replica: ``python main.py node --port 9001 --peers http://127.0.0.1:9002``"""
+    parser = argparse.ArgumentParser(prog="main.py node", description="Run a headless PatentChain ledger node")
+    parser.add_argument("--host", default=NODE_HOST)
+    parser.add_argument("--port", type=int, default=NODE_PORT or 9001)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--peers", default=",".join(PEERS), help="comma-separated peer URLs")
+    parser.add_argument("--seed", type=int, default=0, help="mine N synthetic patents before serving")
+    parser.add_argument("--api-port", type=int, default=API_PORT, help="also serve the query API (0 — off)")
+    args = parser.parse_args(argv)
+
+    ledger = load_ledger(LedgerStore(args.data_dir), PATENT_TYPES)
+    if args.seed:
+        seed_ledger(ledger, args.seed)
+    peers = [p.strip().rstrip("/") for p in args.peers.split(",") if p.strip()]
+    try:
+        node = LedgerNode(ledger, args.host, args.port, peers)
+    except ValueError as e:
+        parser.error(str(e))
+    started = time.perf_counter()
+    adopted = node.sync_all()
+    print(f"PatentChain node {node.url}: height {len(ledger['chain'].chain) - 1}, "
+          f"adopted {adopted} blocks in {time.perf_counter() - started:.2f}s", flush=True)
+    if args.api_port:
+        api = QueryAPI(ledger, args.host, args.api_port).start()
+        print(f"Query API {api.url}", flush=True)
+    node.announce()
+    try:
+        node.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+# ---------------
+# Query API
+# ---------------
+
+API_HOST = os.environ.get("PATENTCHAIN_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("PATENTCHAIN_API_PORT", "0"))     # 0 — API выключен
+API_BATCH_LIMIT = 1000      # максимум patent_id в одном batch-запросе
+
+def _parse_api_date(value, default):
+    return datetime.date.fromisoformat(value) if value else default
+
+class _QueryRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, obj, status=200, etag=None):
+        body = json.dumps(obj, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_ndjson(self, rows, etag):
+        # HTTP/1.0 без Content-Length: пишем построчно, конец ответа — закрытие соединения
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        for row in rows:
+            self.wfile.write(json.dumps(row, default=str).encode() + b"\n")
+
+    def _not_modified(self, etag):
+        """304 if the client already has this version; True when the response is sent"""
+        candidates = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if etag not in candidates and "*" not in candidates:
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+    def _respond(self, path, query):
+        api = self.server.api
+        if path.startswith("/blocks/"):
+            block = api.block(path[len("/blocks/"):])
+            if block is None:
+                self._send_json({"error": "block not found"}, 404)
+            elif not self._not_modified(f'"{block["hash"]}"'):
+                # содержимое блока неизменно для его хэша
+                self._send_json(block, etag=f'"{block["hash"]}"')
+            return
+
+        etag = api.etag()
+        if path == "/stats":
+            if not self._not_modified(etag):
+                self._send_json(api.stats(), etag=etag)
+        elif path == "/patents":
+            ids = [pid for value in query.get("id", []) for pid in value.split(",") if pid.strip()]
+            if not ids or len(ids) > API_BATCH_LIMIT:
+                self._send_json({"error": f"pass 1–{API_BATCH_LIMIT} patent ids"}, 400)
+            elif not self._not_modified(etag):
+                self._send_ndjson(api.patents(ids), etag)
+        elif path == "/search":
+            # сначала ETag: клиент с актуальной версией не тратит время на разбор и поиск
+            if self._not_modified(etag):
+                return
+            try:
+                results = api.search(query)
+            except ValueError as e:
+                self._send_json({"error": str(e)}, 400)
+                return
+            self._send_ndjson(results, etag)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        self._respond(url.path, urllib.parse.parse_qs(url.query))
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        if not isinstance(payload, dict):
+            self._send_json({"error": "expected a JSON object"}, 400)
+            return
+        if url.path != "/patents" or not isinstance(payload.get("ids"), list):
+            self._send_json({"error": "not found"}, 404)
+            return
+        # batch lookup телом запроса — для списков, не влезающих в URL
+        self._respond("/patents", {"id": [str(pid) for pid in payload["ids"]]})
+
+class QueryAPI:
+    """Read-only JSON API over the shared ledger for integrations.
+
+    Endpoints:
+        GET  /stats                       — chain statistics and patent counts (JSON)
+        GET  /patents?id=PAT-1,PAT-2      — batch lookup by patent_id (NDJSON)
+        POST /patents {ids: [...]}        — same, ids in the body
+        GET  /search?q=&type=&status=&priority=&storage=&from=&to=&limit=
+                                          — filtered catalog search (NDJSON)
+        GET  /blocks/<hash>               — one block with its data (JSON)
+
+    Every response carries an ETag: the ledger version (tip hash plus
+    off-chain count) for catalog data, the block hash for blocks. A request
+    with a matching If-None-Match gets 304 without touching the catalog.
+    """
+
+    def __init__(self, ledger, host=API_HOST, port=API_PORT):
+        self.ledger = ledger
+        self.server = ThreadingHTTPServer((host, port), _QueryRequestHandler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def etag(self):
+        tip_hash, off_chain = ledger_version(self.ledger)
+        return f'"{tip_hash[:32]}-{off_chain}"'
+
+    def stats(self):
+        ledger = self.ledger
+        stats = dict(memoize_on_version(ledger, "stats", lambda: _compute_blockchain_stats(ledger)))
+        stats["patents_on_chain"] = dict(ledger["counts_on_chain"])
+        stats["patents_off_chain"] = dict(ledger["counts_off_chain"])
+        stats["status_counts"] = {status: len(queue) for status, queue in ledger["status_queues"].items()}
+        return stats
+
+    def patents(self, ids):
+        for patent_id in ids:
+            patent_id = patent_id.strip().upper()
+            yield get_patent_record(self.ledger, patent_id) or {"patent_id": patent_id, "error": "not found"}
+
+    def search(self, query):
+        arg = lambda name, default="": query.get(name, [default])[0].strip()
+        storage = {"": "All", "on-chain": "On-Chain", "off-chain": "Off-Chain"}.get(arg("storage").lower())
+        if storage is None:
+            raise ValueError("storage must be on-chain or off-chain")
+        filters = {
+            "search_term": arg("q"),
+            "filter_type": arg("type") or "All",
+            "filter_status": arg("status") or "All",
+            "date_from": _parse_api_date(arg("from"), datetime.date.min),
+            "date_to": _parse_api_date(arg("to"), datetime.date.max),
+            "priority_filter": [p for p in arg("priority").split(",") if p],
+            "storage_filter": storage,
+        }
+        patent_ids = search_patents(self.ledger, filters)
+        limit = arg("limit")
+        if limit:
+            patent_ids = patent_ids[:int(limit)]
+        # полные записи поднимаются по мере отправки строк
+        return (get_patent_record(self.ledger, pid) for pid in patent_ids)
+
+    def block(self, block_hash):
+        block_hash = block_hash.strip().lower()
+        for shard, chain in all_chains(self.ledger):
+            block = chain.get_block_by_hash(block_hash)
+            if block is not None:
+                return dict(block.header_dict(), data=block.data, shard=shard)
+        return None
+
 # ---------------
 # Data Models
 # ---------------
@@ -146,18 +1785,75 @@ def generate_patent_id():
     """Generate a unique patent ID"""
     return f"PAT-{str(uuid.uuid4())[:8].upper()}"
 
+# Правила скоринга версионируются: смена правил → новая версия → пересчёт кэша
+SCORING_RULES_VERSION = 2
+
+SCORE_FEATURES = ["title", "description", "doc_hash", "keywords"]
+
+def score_patents(patents: List[Dict]) -> np.ndarray:
+    """Deterministic verification scores for a batch of patents (vectorized with pandas/NumPy)"""
+    # признаки собираются столбцами целиком, без Python-цикла по строкам
+    features = pd.DataFrame.from_records(patents, columns=SCORE_FEATURES).fillna("").astype(str)
+    n = len(features)
+    title_len = features["title"].str.len().to_numpy()
+    description_len = features["description"].str.len().to_numpy()
+    has_doc = (features["doc_hash"] != "").to_numpy()
+    has_keywords = (features["keywords"].str.strip() != "").to_numpy()
+
+    score = np.full(n, 50, dtype=np.int64)  # Base score
+    score += 10 * (title_len > 10)
+    score += 15 * (description_len > 50)
+    score += 20 * has_doc
+    score += 5 * has_keywords
+    score += 5 * (description_len >= 500)   # подробное описание
+    return np.clip(score, 0, 100)
+
 def verify_patent_authenticity(patent_data):
-    """Simulate patent verification process"""
-    score = 50  # Base score
-    if len(patent_data.get("title", "")) > 10:
-        score += 10
-    if len(patent_data.get("description", "")) > 50:
-        score += 15
-    if patent_data.get("doc_hash"):
-        score += 20
-    import random
-    score += random.randint(-5, 15)
-    return min(100, max(0, score))
+    """Score a single patent with the current rules"""
+    return int(score_patents([patent_data])[0])
+
+def rescore_catalog(ledger, patent_ids=None) -> Dict[str, int]:
+    """Scores for ``patent_ids`` (default: the whole catalog) under SCORING_RULES_VERSION.
+
+    Кэш: patent_id -> (версия правил, отпечаток записи, балл). Записи
+    неизменяемы, поэтому отпечаток — это их место хранения (хэш блока или
+    номер оффчейн-записи); пересчитываются только устаревшие патенты.
+    """
+    started = time.perf_counter()
+    catalog, cache = ledger["catalog"], ledger["scores"]
+    ids = list(catalog) if patent_ids is None else [pid for pid in patent_ids if pid in catalog]
+
+    stale, fingerprints = [], []
+    for pid in ids:
+        entry = catalog[pid]
+        if entry["source"] == "blockchain":
+            fingerprint = chain_for(ledger, entry.get("shard")).chain[entry["block_index"]].hash
+        else:
+            fingerprint = f"off-chain:{entry['record_index']}"
+        cached = cache.get(pid)
+        if cached is None or cached[0] != SCORING_RULES_VERSION or cached[1] != fingerprint:
+            stale.append(pid)
+            fingerprints.append(fingerprint)
+
+    if stale:
+        scores = score_patents([get_patent_record(ledger, pid) for pid in stale])
+        for pid, fingerprint, score in zip(stale, fingerprints, scores.tolist()):
+            cache[pid] = (SCORING_RULES_VERSION, fingerprint, score)
+
+    ledger["last_rescore"] = {
+        "version": SCORING_RULES_VERSION,
+        "patents": len(ids),
+        "recomputed": len(stale),
+        "seconds": time.perf_counter() - started,
+    }
+    return {pid: cache[pid][2] for pid in ids}
+
+def rank_patents(ledger, patent_ids) -> List[str]:
+    """Order patents by current verification score, highest first (stable)"""
+    patent_ids = list(patent_ids)
+    scores = rescore_catalog(ledger, patent_ids)
+    values = np.fromiter((scores.get(pid, 0) for pid in patent_ids), dtype=np.int64, count=len(patent_ids))
+    return [patent_ids[i] for i in np.argsort(-values, kind="stable")]
 
 def get_file_size_str(size_bytes):
     """Convert bytes to human readable format"""
@@ -170,38 +1866,51 @@ def get_file_size_str(size_bytes):
     else:
         return f"{size_bytes/(1024**3):.1f} GB"
 
+PATENT_TYPES = [
+    "Utility Patent", "Design Patent", "Plant Patent",
+    "Provisional Patent", "Software Patent", "Business Method Patent",
+    "Biotechnology Patent", "Chemical Patent", "Mechanical Patent",
+    "Certificate of Amendment", "Other"
+]
+
+@st.cache_resource
+def get_ledger():
+    """Process-wide ledger shared by all sessions (loaded once per server)"""
+    ledger = load_ledger(LedgerStore(DATA_DIR), PATENT_TYPES)
+    if NODE_PORT:
+        node = LedgerNode(ledger, NODE_HOST, NODE_PORT, PEERS).start()
+        ledger["node"] = node
+        threading.Thread(target=node.sync_all, daemon=True).start()
+    if API_PORT:
+        ledger["api"] = QueryAPI(ledger, API_HOST, API_PORT).start()
+    return ledger
+
 def initialize_session_state():
     """Initialize all session state variables"""
+    ledger = get_ledger()
+    if "ledger" not in st.session_state:
+        st.session_state.ledger = ledger
     if "toy_chain" not in st.session_state:
-        st.session_state.toy_chain = Blockchain()
+        st.session_state.toy_chain = ledger["chain"]
     if "off_chain_list" not in st.session_state:
-        st.session_state.off_chain_list = []
+        st.session_state.off_chain_list = ledger["off_chain_list"]
 
-    patent_types_list = [
-        "Utility Patent", "Design Patent", "Plant Patent",
-        "Provisional Patent", "Software Patent", "Business Method Patent",
-        "Biotechnology Patent", "Chemical Patent", "Mechanical Patent",
-        "Certificate of Amendment", "Other"
-    ]
+    patent_types_list = PATENT_TYPES
     if "patent_types" not in st.session_state:
         st.session_state.patent_types = patent_types_list
 
-    if "current_user" not in st.session_state:
-        st.session_state.current_user = User("demo_user", "Inventor")
     if "users" not in st.session_state:
-        st.session_state.users = {
-            "demo_user": User("demo_user", "Inventor"),
-            "examiner1": User("examiner1", "Examiner"),
-            "admin": User("admin", "Admin")
-        }
+        st.session_state.users = ledger["users"]
+    if "current_user" not in st.session_state:
+        st.session_state.current_user = st.session_state.users["demo_user"]
 
     if "counts_on_chain" not in st.session_state:
-        st.session_state.counts_on_chain = {ptype: 0 for ptype in patent_types_list}
+        st.session_state.counts_on_chain = ledger["counts_on_chain"]
     if "counts_off_chain" not in st.session_state:
-        st.session_state.counts_off_chain = {ptype: 0 for ptype in patent_types_list}
+        st.session_state.counts_off_chain = ledger["counts_off_chain"]
 
     if "notifications" not in st.session_state:
-        st.session_state.notifications = []
+        st.session_state.notifications = get_inbox(ledger, st.session_state.current_user.username)
 
     if "search_term" not in st.session_state:
         st.session_state.search_term = ""
@@ -209,14 +1918,7 @@ def initialize_session_state():
         st.session_state.filter_type = "All"
 
 def add_notification(message, type="info"):
-    notification = {
-        "id": str(uuid.uuid4())[:8],
-        "message": message,
-        "type": type,  # info, success, warning, error
-        "timestamp": datetime.datetime.now(),
-        "read": False
-    }
-    st.session_state.notifications.insert(0, notification)
+    st.session_state.notifications.push(message, type)
 
 def _parse_iso(ts: str) -> datetime.datetime:
     try:
@@ -225,35 +1927,55 @@ def _parse_iso(ts: str) -> datetime.datetime:
         # на всякий случай поддержим "YYYY-MM-DD HH:MM:SS.mmmmmm"
         return datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f")
 
-def get_blockchain_stats():
-    """Get comprehensive blockchain statistics"""
-    chain = st.session_state.toy_chain.chain
+def _compute_blockchain_stats(ledger):
+    blockchain = ledger["chain"]
+    chain = blockchain.chain
+    chains = [c.chain for _, c in all_chains(ledger)]
     stats = {
-        "total_blocks": len(chain),
-        "total_patents": max(0, len(chain) - 1),  # Exclude genesis
-        "chain_valid": st.session_state.toy_chain.is_chain_valid(),
+        # в шардированном режиме — сумма по главной цепочке и всем шардам
+        "total_blocks": sum(len(c) for c in chains),
+        # блоки смены статуса — не патенты, считаем по rollup-агрегатам
+        "total_patents": sum(ledger["counts_on_chain"].values()),
+        "chain_valid": is_ledger_valid(ledger),
         "average_block_time": 0.0,
-        "total_hash_power": sum(block.nonce for block in chain),
-        "latest_block_hash": chain[-1].hash if chain else "N/A"
+        "total_hash_power": sum(block.nonce for c in chains for block in c),
+        "difficulty_bits": blockchain.difficulty,
+        "latest_block_hash": chain[-1].hash if chain else "N/A",
+        "shards": shard_stats(ledger),
     }
     if len(chain) > 1:
-        timestamps = [_parse_iso(block.timestamp) for block in chain]
-        # среднее по интервалам между ВСЕМИ блоками
+        # генезис с фиксированной датой в среднее не входит (как и в окно ретаргета)
+        timestamps = [_parse_iso(block.timestamp) for block in chain[1:]]
         if len(timestamps) > 1:
             diffs = [(timestamps[i] - timestamps[i-1]).total_seconds() for i in range(1, len(timestamps))]
             stats["average_block_time"] = sum(diffs) / len(diffs)
     return stats
 
+def get_blockchain_stats():
+    """Get comprehensive blockchain statistics (recomputed only when the ledger changes)"""
+    ledger = st.session_state.ledger
+    return dict(memoize_on_version(ledger, "stats", lambda: _compute_blockchain_stats(ledger)))
+
 # ---------------
 # UI Components
 # ---------------
 
+def _go_to(section):
+    st.session_state.section = section
+
 def render_sidebar():
     """Render the enhanced sidebar"""
     with st.sidebar:
         st.image("https://via.placeholder.com/200x80/2E86AB/FFFFFF?text=PatentChain", width=200)
 
         st.markdown("---")
+        usernames = list(st.session_state.users)
+        selected = st.selectbox("Switch user", usernames,
+                                index=usernames.index(st.session_state.current_user.username))
+        if selected != st.session_state.current_user.username:
+            st.session_state.current_user = st.session_state.users[selected]
+            st.session_state.notifications = get_inbox(st.session_state.ledger, selected)
+            st.rerun()
         st.markdown(f"**👤 User:** {st.session_state.current_user.username}")
         st.markdown(f"**🎭 Role:** {st.session_state.current_user.role}")
         st.markdown(f"**📅 Member since:** {st.session_state.current_user.created_at.strftime('%Y-%m-%d')}")
@@ -265,19 +1987,20 @@ def render_sidebar():
         st.metric("Blockchain Health", "✅ Valid" if stats["chain_valid"] else "❌ Invalid")
 
         st.markdown("---")
-        unread_count = sum(1 for n in st.session_state.notifications if not n["read"])
-        st.button(f"🔔 Notifications ({unread_count})")
+        if st.button(f"🔔 Notifications ({st.session_state.notifications.unread})"):
+            st.session_state.notifications.mark_all_read()
+            st.rerun()
 
         st.markdown("---")
         st.markdown("**🧭 Quick Navigation**")
-        st.button("📝 Submit Patent", use_container_width=True)
-        st.button("🔍 Search Patents", use_container_width=True)
-        st.button("📈 Analytics", use_container_width=True)
+        st.button("📝 Submit Patent", use_container_width=True, on_click=_go_to, args=("📝 Submit Patent",))
+        st.button("🔍 Search Patents", use_container_width=True, on_click=_go_to, args=("🔍 Search & Browse",))
+        st.button("📈 Analytics", use_container_width=True, on_click=_go_to, args=("📈 Analytics",))
 
 def render_notification_panel():
     if st.session_state.notifications:
         with st.expander(f"🔔 Notifications ({len(st.session_state.notifications)})", expanded=False):
-            for notification in st.session_state.notifications[:5]:
+            for notification in st.session_state.notifications.latest(5):
                 icon = {"info": "ℹ️", "success": "✅", "warning": "⚠️", "error": "❌"}.get(notification["type"], "ℹ️")
                 st.markdown(f"{icon} **{notification['timestamp'].strftime('%H:%M')}** - {notification['message']}")
 
@@ -341,9 +2064,22 @@ def _block_card(block: Block):
         unsafe_allow_html=True
     )
 
-    # Краткое резюме данных
-    data = block.data or {}
+    # Краткое резюме данных (без подъёма payload'а)
+    data = block.summary
+    if data.get("tx_type") == TX_BEACON:
+        st.write("**Beacon — committed shard tips**")
+        st.dataframe(pd.DataFrame([{"Shard": name, "Height": tip["height"], "Tip hash": tip["hash"]}
+                                   for name, tip in data["shard_tips"].items()]), hide_index=True)
+        return
     summary_cols = st.columns(4)
+    if data.get("tx_type") == TX_STATUS_CHANGE:
+        summary_cols[0].write(f"**Patent ID**\n{data.get('patent_id','—')}")
+        summary_cols[1].write(f"**Transition**\n{data.get('from_status')} → {data.get('to_status')}")
+        summary_cols[2].write(f"**Changed by**\n{data.get('changed_by','—')}")
+        summary_cols[3].write(f"**Reason**\n{data.get('reason') or '—'}")
+        with st.expander("📦 Full Block Data"):
+            st.json(block.data)
+        return
     summary_cols[0].write(f"**Patent ID**\n{data.get('patent_id','—')}")
     summary_cols[1].write(f"**Type**\n{data.get('patent_type','—')}")
     summary_cols[2].write(f"**Priority**\n{data.get('priority','—')}")
@@ -352,6 +2088,49 @@ def _block_card(block: Block):
     with st.expander("📦 Full Block Data"):
         st.json(block.data)
 
+QUEUE_PAGE_SIZE = 50
+
+def render_examiner_queue():
+    """Work queues per status for Examiner/Admin, backed by the status index"""
+    ledger = st.session_state.ledger
+    queues = ledger["status_queues"]
+
+    cols = st.columns(len(STATUSES))
+    for col, status in zip(cols, STATUSES):
+        col.metric(status, len(queues.get(status, {})))
+
+    queue_status = st.radio("Queue", list(STATUS_TRANSITIONS), horizontal=True, key="queue_status")
+    queue = queues.get(queue_status, {})
+    if not queue:
+        st.info(f"No {queue_status.lower()} patents in the queue.")
+        return
+
+    if st.checkbox(f"Rank by verification score (rules v{SCORING_RULES_VERSION})", key="queue_rank"):
+        head = rank_patents(ledger, queue)[:QUEUE_PAGE_SIZE]
+        scores = rescore_catalog(ledger, head)
+    else:
+        # первые QUEUE_PAGE_SIZE в порядке поступления
+        head = [pid for pid, _ in zip(queue, range(QUEUE_PAGE_SIZE))]
+        scores = {}
+    patent_id = st.selectbox(
+        "Patent",
+        head,
+        format_func=lambda pid: (f"{pid} — {(get_patent_record(ledger, pid) or {}).get('title', '')}"
+                                 + (f" (score {scores[pid]})" if pid in scores else "")),
+        key="queue_patent"
+    )
+    reason = st.text_input("Reason / examiner note", key="queue_reason")
+
+    action_cols = st.columns(len(STATUS_TRANSITIONS[queue_status]))
+    for col, new_status in zip(action_cols, STATUS_TRANSITIONS[queue_status]):
+        if col.button(f"Mark {new_status}", key=f"queue_{new_status}", use_container_width=True):
+            try:
+                block = change_status(ledger, patent_id, new_status, st.session_state.current_user, reason)
+                maybe_checkpoint(ledger)
+                st.success(f"✅ {patent_id} → {new_status} (block #{block.index})")
+            except (PermissionError, ValueError) as e:
+                st.error(f"❌ {e}")
+
 def render_analytics_dashboard():
     st.header("📈 Patent Analytics Dashboard")
 
@@ -393,23 +2172,71 @@ def render_analytics_dashboard():
     h2.metric("Average Block Time", f"{stats['average_block_time']:.2f}s")
     h3.metric("Total Mining Power", f"{stats['total_hash_power']:,}")
 
+EXPLORER_PAGE_SIZE = 10
+
+@st.fragment
 def render_blockchain_explorer():
     st.subheader("⛓️ Blockchain Explorer")
-    chain = st.session_state.toy_chain.chain
+    ledger = st.session_state.ledger
+    shard = None
+    if ledger["shards"]:
+        shard = st.selectbox(
+            "Chain",
+            [None] + list(ledger["shards"]),
+            format_func=lambda name: "Main chain (beacons)" if name is None else f"Shard: {name}",
+            key="explorer_chain"
+        )
+    blockchain = chain_for(ledger, shard)
+    chain = blockchain.chain
 
     c1, c2, c3 = st.columns(3)
     c1.metric("Total Blocks", len(chain))
     c2.metric("Latest Block", f"#{len(chain)-1}")
     c3.metric("Latest Hash", chain[-1].hash[:16] + "..." if chain else "N/A")
 
-    if chain:
-        block_index = st.selectbox(
-            "Select Block to Explore",
-            range(len(chain)),
-            format_func=lambda x: f"Block #{x}" + (" (Genesis)" if x == 0 else "")
-        )
-        _block_card(chain[block_index])
+    if not chain:
+        return
+
+    query = st.text_input(
+        "Find block",
+        placeholder="Block hash, patent ID (PAT-XXXXXXXX) or block #index",
+        key="explorer_query"
+    )
+    if query.strip():
+        found = blockchain.find_block(query)
+        # хэш или ID патента может лежать в другом шарде
+        for _, other in all_chains(ledger):
+            if found is not None:
+                break
+            found = other.get_block_by_hash(query.strip().lower()) or other.get_block_by_patent_id(query.strip().upper())
+        entry = ledger["catalog"].get(query.strip().upper())
+        if found is None and entry and entry["source"] == "off-chain":
+            st.info(f"{query.strip().upper()} is stored off-chain (record #{entry['record_index']}), not in a block.")
+        elif found is None:
+            st.warning(f"No block found for “{query.strip()}”.")
+        else:
+            _block_card(found)
+        return
+
+    # Постранично: в браузер уходит только окно из EXPLORER_PAGE_SIZE блоков
+    total_pages = (len(chain) - 1) // EXPLORER_PAGE_SIZE + 1
+    if st.session_state.get("explorer_page", 1) > total_pages:
+        st.session_state.explorer_page = total_pages   # другая цепочка короче
+    page = st.number_input(
+        f"Page (1–{total_pages}, newest first)",
+        min_value=1, max_value=total_pages, value=1, step=1,
+        key="explorer_page"
+    )
+    newest = len(chain) - 1 - (page - 1) * EXPLORER_PAGE_SIZE
+    window = range(newest, max(-1, newest - EXPLORER_PAGE_SIZE), -1)
+    block_index = st.selectbox(
+        "Select Block to Explore",
+        window,
+        format_func=lambda x: f"Block #{x}" + (" (Genesis)" if x == 0 else "")
+    )
+    _block_card(chain[block_index])
 
+@st.fragment
 def export_data():
     st.subheader("📤 Export Patent Data")
 
@@ -422,19 +2249,29 @@ def export_data():
 
         # On-chain
         if include_blockchain:
-            for block in st.session_state.toy_chain.chain[1:]:  # Skip genesis
-                row = {
-                    "source": "blockchain",
-                    "block_index": block.index,
-                    "timestamp": block.timestamp,  # добавили для сортировки/фильтров
-                    "block_hash": block.hash,
-                }
-                # плоское объединение
-                row.update(block.data or {})
-                data.append(row)
+            ledger = st.session_state.ledger
+            catalog = ledger["catalog"]
+            for shard, blockchain in all_chains(ledger):
+                for block in blockchain.chain[1:]:  # Skip genesis
+                    # смены статуса и beacon'ы — служебные транзакции, не патенты
+                    if block.summary.get("tx_type") in (TX_STATUS_CHANGE, TX_BEACON):
+                        continue
+                    row = {
+                        "source": "blockchain",
+                        "block_index": block.index,
+                        "timestamp": block.timestamp,  # добавили для сортировки/фильтров
+                        "block_hash": block.hash,
+                    }
+                    if ledger["shards"]:
+                        row["shard"] = shard
+                    # плоское объединение
+                    row.update(block.data or {})
+                    row["status"] = catalog.get(row.get("patent_id"), {}).get("status", row.get("status"))
+                    data.append(row)
 
         # Off-chain
         if include_offchain:
+            catalog = st.session_state.ledger["catalog"]
             for i, record in enumerate(st.session_state.off_chain_list):
                 row = {
                     "source": "off-chain",
@@ -443,12 +2280,18 @@ def export_data():
                     "block_hash": None
                 }
                 row.update(record.get("data", {}))
+                row["status"] = catalog.get(row.get("patent_id"), {}).get("status", row.get("status"))
                 data.append(row)
 
         if not data:
             st.info("Nothing to export with selected options.")
             return
 
+        # баллы по текущим правилам (SCORING_RULES_VERSION), а не сохранённые при подаче
+        scores = rescore_catalog(st.session_state.ledger, [row.get("patent_id") for row in data])
+        for row in data:
+            row["verification_score"] = scores.get(row.get("patent_id"), row.get("verification_score"))
+
         df = pd.DataFrame(data)
 
         ts_fname = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -484,6 +2327,475 @@ def export_data():
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
+def render_submit_patent():
+    st.header("📝 Submit New Patent")
+
+    # Add debug information
+    if st.checkbox("Show Debug Info", value=False):
+        st.write("**Debug Information:**")
+        st.write(f"Current user: {st.session_state.current_user.username}")
+        st.write(f"Session state keys: {list(st.session_state.keys())}")
+        st.write(f"Patent types available: {len(st.session_state.patent_types)}")
+
+    with st.form("enhanced_patent_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            patent_title = st.text_input("Patent Title *", max_chars=100,
+                                         help="Enter a descriptive title for your invention")
+            inventor_name = st.text_input("Inventor Name *",
+                                          value=st.session_state.current_user.username,
+                                          help="Primary inventor or applicant name")
+            patent_type = st.selectbox("Patent Type *",
+                                       options=st.session_state.patent_types,
+                                       help="Select the most appropriate patent category")
+        with col2:
+            priority = st.selectbox("Priority Level", ["Low", "Normal", "High", "Critical"])
+            store_option = st.radio("Storage Option",
+                                    ("On Blockchain", "Off Blockchain"),
+                                    help="Blockchain storage provides immutability but costs more")
+            estimated_value = st.number_input("Estimated Value ($)", min_value=0, value=10000,
+                                              help="Estimated commercial value of the patent")
+
+        patent_description = st.text_area("Detailed Description *", height=150,
+                                          help="Provide a comprehensive description of your invention")
+
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            uploaded_file = st.file_uploader(
+                "Attach Supporting Documents",
+                type=["pdf", "txt", "png", "jpg", "docx", "xlsx"],
+                help="Upload relevant documents, diagrams, or specifications"
+            )
+        with col2:
+            if uploaded_file is not None:
+                file_size_h = get_file_size_str(getattr(uploaded_file, "size", 0))
+                st.success(f"File: {uploaded_file.name}")
+                st.info(f"Size: {file_size_h}")
+
+        with st.expander("📋 Additional Information"):
+            col1, col2 = st.columns(2)
+            with col1:
+                keywords = st.text_input("Keywords (comma-separated)",
+                                         help="Enter relevant keywords for searchability")
+                related_patents = st.text_input("Related Patent IDs",
+                                                help="Reference any related or prior patents")
+            with col2:
+                collaboration = st.text_input("Co-inventors",
+                                              help="List any co-inventors or collaborators")
+                funding_source = st.text_input("Funding Source",
+                                               help="Grant number, company, or funding organization")
+
+        # Make the checkbox more prominent
+        st.markdown("---")
+
+        # Form submission
+        submitted = st.form_submit_button(
+            "🚀 Submit Patent Application",
+            use_container_width=True,
+            type="primary"
+        )
+
+        # Enhanced form processing with better error handling
+        if submitted:
+            try:
+                # Validation
+                required_fields = [
+                    (patent_title.strip(), "Patent Title"),
+                    (inventor_name.strip(), "Inventor Name"), 
+                    (patent_description.strip(), "Patent Description")
+                ]
+
+                missing_fields = [field_name for field_value, field_name in required_fields if not field_value]
+
+                if missing_fields:
+                    st.error(f"❌ Please fill in the following required fields: {', '.join(missing_fields)}")
+                    st.stop()
+
+                # Show processing message
+                with st.spinner("Processing your patent application..."):
+                    # File processing
+                    doc_hash = ""
+                    file_name = None
+                    file_size = 0
+
+                    if uploaded_file is not None:
+                        try:
+                            file_bytes = uploaded_file.getvalue()
+                            doc_hash = hash_file_bytes(file_bytes)
+                            file_name = uploaded_file.name
+                            file_size = getattr(uploaded_file, "size", len(file_bytes))
+                            st.info(f"✅ File processed: {file_name} ({get_file_size_str(file_size)})")
+                        except Exception as e:
+                            st.error(f"❌ Error processing file: {str(e)}")
+                            st.stop()
+                    elif patent_description.strip():
+                        doc_hash = hashlib.sha256(patent_description.encode()).hexdigest()
+
+                    # Generate patent data
+                    patent_id = generate_patent_id()
+                    now_iso = datetime.datetime.now().isoformat()
+
+                    patent_data = {
+                        "patent_id": patent_id,
+                        "title": patent_title,
+                        "description": patent_description,
+                        "inventor": inventor_name,
+                        "patent_type": patent_type,
+                        "priority": priority,
+                        "doc_hash": doc_hash,
+                        "estimated_value": estimated_value,
+                        "keywords": keywords,
+                        "related_patents": related_patents,
+                        "collaboration": collaboration,
+                        "funding_source": funding_source,
+                        "is_on_blockchain": (store_option == "On Blockchain"),
+                        "status": "Pending",
+                        "created_by": st.session_state.current_user.username,
+                        "file_name": file_name,
+                        "file_size": file_size,
+                        "timestamp": now_iso
+                    }
+                    # балл по всем полям заявки (ключевые слова тоже учитываются)
+                    patent_data["verification_score"] = verify_patent_authenticity(patent_data)
+
+                    # Store patent
+                    ledger = st.session_state.ledger
+                    ledger["bus"].publish(EVENT_SUBMITTED, data=patent_data, origin="local")
+                    if patent_data["is_on_blockchain"]:
+                        try:
+                            st.info("⛏️ Mining block on blockchain...")
+                            time.sleep(0.5)  # Simulate mining time
+                            new_block = mine_patent(ledger, patent_data, now_iso)
+
+                            st.success(f"🎉 Patent {patent_id} successfully recorded on the blockchain!")
+                            st.info(f"🔗 Block #{new_block.index} created with hash: {new_block.hash[:16]}...")
+
+                        except Exception as e:
+                            st.error(f"❌ Error adding to blockchain: {str(e)}")
+                            st.error("Falling back to off-chain storage...")
+                            # Fallback to off-chain
+                            patent_data["is_on_blockchain"] = False
+                            store_off_chain(ledger, {
+                                "timestamp": now_iso,
+                                "data": patent_data
+                            })
+
+                    else:
+                        try:
+                            store_off_chain(ledger, {
+                                "timestamp": now_iso,
+                                "data": patent_data
+                            })
+                            st.success(f"📄 Patent {patent_id} stored off-chain successfully!")
+
+                        except Exception as e:
+                            st.error(f"❌ Error storing patent: {str(e)}")
+                            st.stop()
+
+                    maybe_checkpoint(ledger)
+
+                    # Show verification score
+                    score = patent_data["verification_score"]
+                    if score >= 80:
+                        st.success(f"🏆 High verification score: {score}/100")
+                    elif score >= 60:
+                        st.info(f"✅ Good verification score: {score}/100")
+                    else:
+                        st.warning(f"⚠️ Low verification score: {score}/100 - Consider adding more details")
+
+                    # Show summary
+                    with st.expander("📋 Submission Summary", expanded=True):
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.write(f"**Patent ID:** {patent_id}")
+                            st.write(f"**Title:** {patent_title}")
+                            st.write(f"**Type:** {patent_type}")
+                            st.write(f"**Priority:** {priority}")
+                        with col2:
+                            st.write(f"**Storage:** {'Blockchain' if patent_data['is_on_blockchain'] else 'Off-Chain'}")
+                            st.write(f"**Status:** {patent_data['status']}")
+                            st.write(f"**Verification Score:** {score}/100")
+                            st.write(f"**Submitted:** {now_iso[:19]}")
+
+                    st.balloons()
+
+            except Exception as e:
+                st.error(f"❌ Unexpected error during submission: {str(e)}")
+                st.error("Please try again or contact system administrator.")
+                # Optional: Show technical details for debugging
+                if st.checkbox("Show technical details"):
+                    st.exception(e)
+
+def _patent_summary(ledger, patent_id) -> Optional[Dict]:
+    """Filter/sort fields of a patent without loading its payload from cold storage"""
+    entry = ledger["catalog"].get(patent_id)
+    if entry is None:
+        return None
+    if entry["source"] == "blockchain":
+        block = chain_for(ledger, entry.get("shard")).chain[entry["block_index"]]
+        summary = dict(block.summary)
+        summary.setdefault("timestamp", block.timestamp)
+    else:
+        record = ledger["off_chain_list"][entry["record_index"]]
+        summary = dict(record["data"] or {}, timestamp=record["timestamp"])
+    summary["status"] = entry["status"]
+    return summary
+
+def _filter_patents(ledger, filters) -> List[str]:
+    """Ids of catalog patents matching the search filters.
+
+    Фильтры идут по summary (в памяти); payload поднимается только ради
+    описания — у строк, прошедших остальные фильтры и не совпавших по title/inventor/id.
+    """
+    # фильтр статуса сразу берёт нужную очередь
+    if filters["filter_status"] != "All":
+        patent_ids = list(ledger["status_queues"].get(filters["filter_status"], {}))
+    else:
+        patent_ids = list(ledger["catalog"])
+    q = filters["search_term"].lower()
+    on_chain = {"On-Chain": True, "Off-Chain": False}.get(filters["storage_filter"])
+
+    matched = []
+    for patent_id in patent_ids:
+        p = _patent_summary(ledger, patent_id)
+        if p is None:
+            continue
+        if filters["filter_type"] != "All" and p.get("patent_type") != filters["filter_type"]:
+            continue
+        if filters["priority_filter"] and p.get("priority") not in filters["priority_filter"]:
+            continue
+        if on_chain is not None and p.get("is_on_blockchain") is not on_chain:
+            continue
+        try:
+            dt = _parse_iso(p.get("timestamp", datetime.datetime.min.isoformat())).date()
+        except Exception:
+            dt = datetime.date.min
+        if not filters["date_from"] <= dt <= filters["date_to"]:
+            continue
+        if q and not (q in p.get("title", "").lower()
+                      or q in p.get("inventor", "").lower()
+                      or q in p.get("patent_id", "").lower()):
+            description = p.get("description")
+            if description is None:
+                description = (get_patent_record(ledger, patent_id) or {}).get("description", "")
+            if q not in description.lower():
+                continue
+        matched.append(patent_id)
+    return matched
+
+def search_patents(ledger, filters) -> Tuple[str, ...]:
+    """Ids of filtered patents, memoized per ledger version and filter combination"""
+    key = ("search",) + tuple(tuple(v) if isinstance(v, list) else v for v in filters.values())
+    return memoize_on_version(ledger, key, lambda: tuple(_filter_patents(ledger, filters)))
+
+RESULTS_PAGE_SIZE = 20
+RESULT_SORT_KEYS = {
+    # вариант сортировки → (поле summary, по убыванию, значение по умолчанию)
+    "Newest First": ("timestamp", True, ""),
+    "Oldest First": ("timestamp", False, ""),
+    "Title A-Z": ("title", False, ""),
+    "Verification Score": None,    # rank_patents: баллы по текущим правилам, не сохранённые
+}
+
+def _sort_patent_ids(ledger, patent_ids, sort_by) -> List[str]:
+    """Result order for the search page, computed from summaries and current scores"""
+    if RESULT_SORT_KEYS[sort_by] is None:
+        return rank_patents(ledger, patent_ids)
+    field, reverse, default = RESULT_SORT_KEYS[sort_by]
+    keys = [(_patent_summary(ledger, pid) or {}).get(field, default) for pid in patent_ids]
+    order = sorted(range(len(patent_ids)), key=keys.__getitem__, reverse=reverse)
+    return [patent_ids[i] for i in order]
+
+@st.fragment
+def render_search_and_browse():
+    filters = render_advanced_search()
+
+    ledger = st.session_state.ledger
+    if st.session_state.current_user.role in STATUS_ROLES:
+        with st.expander("🧑‍⚖️ Examiner Work Queue", expanded=True):
+            render_examiner_queue()
+
+    patent_ids = search_patents(ledger, filters)
+
+    # Вывод
+    st.subheader(f"📋 Patent Results ({len(patent_ids)} found)")
+
+    if patent_ids:
+        sort_by = st.selectbox("Sort by", list(RESULT_SORT_KEYS))
+        ordered = memoize_on_version(ledger, ("search_order", sort_by, patent_ids),
+                                     lambda: _sort_patent_ids(ledger, patent_ids, sort_by))
+
+        # Постранично: полные записи (payload) поднимаются только для показанной страницы
+        total_pages = (len(ordered) - 1) // RESULTS_PAGE_SIZE + 1
+        if st.session_state.get("results_page", 1) > total_pages:
+            st.session_state.results_page = total_pages   # выдача сузилась
+        page = st.number_input(
+            f"Page (1–{total_pages})",
+            min_value=1, max_value=total_pages, value=1, step=1,
+            key="results_page"
+        )
+        page_ids = ordered[(page - 1) * RESULTS_PAGE_SIZE:page * RESULTS_PAGE_SIZE]
+        scores = rescore_catalog(ledger, page_ids)
+        for patent_id in page_ids:
+            patent = get_patent_record(ledger, patent_id)
+            created = patent.get('timestamp', '')
+            created_short = created.replace("T", " ")[:19] if created else "Unknown"
+            st.markdown(f"""
+            <div class="patent-card">
+                <div style="display:flex;justify-content:space-between;align-items:start;gap:16px;">
+                    <div style="flex:1;">
+                        <h4 style="margin:0;">{patent.get('title','Untitled')}</h4>
+                        <p style="margin:4px 0 6px 0;"><strong>ID:</strong> {patent.get('patent_id','N/A')} &nbsp;|&nbsp;
+                           <strong>Type:</strong> {patent.get('patent_type','Unknown')} &nbsp;|&nbsp;
+                           <strong>Inventor:</strong> {patent.get('inventor','Unknown')}</p>
+                        <p style="margin:4px 0 6px 0;"><strong>Description:</strong> {patent.get('description','No description')[:200]}{'...' if len(patent.get('description',''))>200 else ''}</p>
+                        <p style="margin:4px 0 0 0;"><strong>Storage:</strong> {'🔗 Blockchain' if patent.get('is_on_blockchain') else '📁 Off-Chain'} &nbsp;|&nbsp;
+                           <strong>Created:</strong> {created_short}</p>
+                    </div>
+                    <div style="text-align:right;min-width:120px;">
+                        <span class="priority-{patent.get('priority','normal').lower()}">{patent.get('priority','Normal')}</span><br>
+                        <span class="status-{patent.get('status','pending').lower()}">{patent.get('status','Pending')}</span><br>
+                        <small>Score: {scores.get(patent_id, 0)}/100</small>
+                    </div>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+    else:
+        st.info("No patents found matching your search criteria.")
+
+def render_system_info():
+    st.header("⚙️ System Information")
+
+    # Презентабельные системные метрики
+    stats = get_blockchain_stats()
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Blocks", stats["total_blocks"])
+    m2.metric("Chain Valid", "Yes" if stats["chain_valid"] else "No")
+    m3.metric("Avg Block Time", f"{stats['average_block_time']:.2f}s")
+    m4.metric("Hash Power (Σ nonce)", f"{stats['total_hash_power']}")
+
+    # Табличка «как JSON, но красиво»
+    table_data = [
+        ("Blockchain Status", "Active"),
+        ("Total Blocks", stats["total_blocks"]),
+        ("Chain Validity", stats["chain_valid"]),
+        ("Mining Difficulty", f"{stats['difficulty_bits']:.2f} bits"),
+        ("Target Block Time", f"{st.session_state.toy_chain.target_block_time:.0f}s"),
+        ("Total Hash Power", stats["total_hash_power"]),
+        ("Average Block Time", f"{stats['average_block_time']:.2f}s"),
+        ("Total Users", len(st.session_state.users)),
+        ("Current User", st.session_state.current_user.username),
+        ("Total Notifications", len(st.session_state.notifications)),
+        ("Data Directory", st.session_state.ledger["store"].data_dir),
+        ("Last Checkpoint Height", st.session_state.toy_chain.trusted_height),
+        ("Blocks Verified on Load", st.session_state.ledger["status"]["verified_blocks"]),
+        ("Load Time", f"{st.session_state.ledger['status']['load_seconds']:.3f}s"),
+    ]
+    node = st.session_state.ledger.get("node")
+    if node is not None:
+        table_data += [
+            ("Node URL", node.url),
+            ("Peers", ", ".join(node.peers) or "—"),
+            ("Last Sync", json.dumps(node.last_sync) if node.last_sync else "—"),
+        ]
+    api = st.session_state.ledger.get("api")
+    if api is not None:
+        table_data.append(("Query API", api.url))
+    if stats["shards"]:
+        pool = st.session_state.ledger["mining_pool"]
+        table_data += [
+            ("Shards", len(stats["shards"])),
+            ("Mining Workers", pool.workers if pool else 1),
+            ("Shard Blocks Since Beacon", shard_blocks_since_beacon(st.session_state.ledger)),
+        ]
+    st.table(pd.DataFrame(table_data, columns=["Metric", "Value"]))
+
+    if stats["shards"]:
+        st.subheader("🧩 Shards")
+        shard_df = pd.DataFrame(stats["shards"])
+        shard_df["tip_hash"] = shard_df["tip_hash"].str[:16] + "…"
+        st.dataframe(shard_df, hide_index=True, use_container_width=True)
+
+    errors = st.session_state.ledger["bus"].errors
+    if errors:
+        st.subheader("⚠️ Event Handler Errors")
+        st.warning(f"{len(errors)} recent subscriber failure(s): catalog, queues or counts "
+                   "may be out of sync with the ledger.")
+        st.code("\n".join(reversed(errors)), language=None)
+
+    render_system_tools()
+
+@st.fragment
+def render_system_tools():
+    st.subheader("🔧 System Tools")
+    colA, colB, colC, colD, colE = st.columns(5)
+
+    with colA:
+        if st.button("🔄 Validate Blockchain"):
+            with st.spinner("Validating blockchain integrity..."):
+                time.sleep(0.3)
+                ledger = st.session_state.ledger
+                # по каждой цепочке отдельно, чтобы назвать сломанный шард
+                broken = [shard or "main chain" for shard, chain in all_chains(ledger)
+                          if not chain.is_chain_valid(full=True)]
+                if not beacons_valid(ledger):
+                    broken.append("beacon commitments")
+                if not broken:
+                    st.success("✅ Blockchain is valid!")
+                elif ledger["shards"]:
+                    st.error(f"❌ Blockchain validation failed: {', '.join(broken)}")
+                else:
+                    st.error("❌ Blockchain validation failed!")
+
+    with colB:
+        if st.button("🧹 Clear Notifications"):
+            st.session_state.notifications.clear()
+            st.success("Notifications cleared!")
+
+    with colC:
+        if st.button("📊 Generate System Report"):
+            report = {
+                "timestamp": datetime.datetime.now().isoformat(),
+                "system_stats": get_blockchain_stats(),
+                "user_count": len(st.session_state.users),
+                "patent_counts": {
+                    "on_chain": sum(st.session_state.counts_on_chain.values()),
+                    "off_chain": sum(st.session_state.counts_off_chain.values())
+                }
+            }
+            st.json(report)
+            st.download_button(
+                "Download Report",
+                json.dumps(report, indent=2),
+                file_name=f"system_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
+
+    with colD:
+        if st.button("💾 Create Checkpoint"):
+            try:
+                path = write_checkpoint(st.session_state.ledger)
+                st.success(f"Checkpoint saved: {os.path.basename(path)}")
+            except ValueError as e:
+                st.error(str(e))
+
+    with colE:
+        if st.button("🧮 Re-score Catalog"):
+            rescore_catalog(st.session_state.ledger)
+            info = st.session_state.ledger["last_rescore"]
+            st.success(f"Rules v{info['version']}: {info['recomputed']} of {info['patents']} "
+                       f"patents recomputed in {info['seconds']:.3f}s")
+
+# Раздел → функция отрисовки; выполняется только выбранный
+SECTIONS = {
+    "📝 Submit Patent": render_submit_patent,
+    "🔍 Search & Browse": render_search_and_browse,
+    "⛓️ Blockchain Explorer": render_blockchain_explorer,
+    "📈 Analytics": render_analytics_dashboard,
+    "📤 Export Data": export_data,
+    "⚙️ System Info": render_system_info,
+}
+
 # ---------------
 # Main Application
 # ---------------
@@ -538,407 +2850,16 @@ def main():
     # Notification panel
     render_notification_panel()
 
-    # Tabs
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-        "📝 Submit Patent",
-        "🔍 Search & Browse",
-        "⛓️ Blockchain Explorer",
-        "📈 Analytics",
-        "📤 Export Data",
-        "⚙️ System Info"
-    ])
-
-    with tab1:
-        st.header("📝 Submit New Patent")
-        
-        # Add debug information
-        if st.checkbox("Show Debug Info", value=False):
-            st.write("**Debug Information:**")
-            st.write(f"Current user: {st.session_state.current_user.username}")
-            st.write(f"Session state keys: {list(st.session_state.keys())}")
-            st.write(f"Patent types available: {len(st.session_state.patent_types)}")
-        
-        with st.form("enhanced_patent_form", clear_on_submit=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                patent_title = st.text_input("Patent Title *", max_chars=100,
-                                             help="Enter a descriptive title for your invention")
-                inventor_name = st.text_input("Inventor Name *",
-                                              value=st.session_state.current_user.username,
-                                              help="Primary inventor or applicant name")
-                patent_type = st.selectbox("Patent Type *",
-                                           options=st.session_state.patent_types,
-                                           help="Select the most appropriate patent category")
-            with col2:
-                priority = st.selectbox("Priority Level", ["Low", "Normal", "High", "Critical"])
-                store_option = st.radio("Storage Option",
-                                        ("On Blockchain", "Off Blockchain"),
-                                        help="Blockchain storage provides immutability but costs more")
-                estimated_value = st.number_input("Estimated Value ($)", min_value=0, value=10000,
-                                                  help="Estimated commercial value of the patent")
-
-            patent_description = st.text_area("Detailed Description *", height=150,
-                                              help="Provide a comprehensive description of your invention")
-
-            col1, col2 = st.columns([2, 1])
-            with col1:
-                uploaded_file = st.file_uploader(
-                    "Attach Supporting Documents",
-                    type=["pdf", "txt", "png", "jpg", "docx", "xlsx"],
-                    help="Upload relevant documents, diagrams, or specifications"
-                )
-            with col2:
-                if uploaded_file is not None:
-                    file_size_h = get_file_size_str(getattr(uploaded_file, "size", 0))
-                    st.success(f"File: {uploaded_file.name}")
-                    st.info(f"Size: {file_size_h}")
-
-            with st.expander("📋 Additional Information"):
-                col1, col2 = st.columns(2)
-                with col1:
-                    keywords = st.text_input("Keywords (comma-separated)",
-                                             help="Enter relevant keywords for searchability")
-                    related_patents = st.text_input("Related Patent IDs",
-                                                    help="Reference any related or prior patents")
-                with col2:
-                    collaboration = st.text_input("Co-inventors",
-                                                  help="List any co-inventors or collaborators")
-                    funding_source = st.text_input("Funding Source",
-                                                   help="Grant number, company, or funding organization")
-
-            # Make the checkbox more prominent
-            st.markdown("---")
-
-            # Form submission
-            submitted = st.form_submit_button(
-                "🚀 Submit Patent Application",
-                use_container_width=True,
-                type="primary"
-            )
-
-            # Enhanced form processing with better error handling
-            if submitted:
-                try:
-                    # Validation
-                    required_fields = [
-                        (patent_title.strip(), "Patent Title"),
-                        (inventor_name.strip(), "Inventor Name"), 
-                        (patent_description.strip(), "Patent Description")
-                    ]
-                    
-                    missing_fields = [field_name for field_value, field_name in required_fields if not field_value]
-                    
-                    if missing_fields:
-                        st.error(f"❌ Please fill in the following required fields: {', '.join(missing_fields)}")
-                        st.stop()
-                    
-                    # Show processing message
-                    with st.spinner("Processing your patent application..."):
-                        # File processing
-                        doc_hash = ""
-                        file_name = None
-                        file_size = 0
-                        
-                        if uploaded_file is not None:
-                            try:
-                                file_bytes = uploaded_file.getvalue()
-                                doc_hash = hash_file_bytes(file_bytes)
-                                file_name = uploaded_file.name
-                                file_size = getattr(uploaded_file, "size", len(file_bytes))
-                                st.info(f"✅ File processed: {file_name} ({get_file_size_str(file_size)})")
-                            except Exception as e:
-                                st.error(f"❌ Error processing file: {str(e)}")
-                                st.stop()
-                        elif patent_description.strip():
-                            doc_hash = hashlib.sha256(patent_description.encode()).hexdigest()
-
-                        # Generate patent data
-                        patent_id = generate_patent_id()
-                        now_iso = datetime.datetime.now().isoformat()
-
-                        patent_data = {
-                            "patent_id": patent_id,
-                            "title": patent_title,
-                            "description": patent_description,
-                            "inventor": inventor_name,
-                            "patent_type": patent_type,
-                            "priority": priority,
-                            "doc_hash": doc_hash,
-                            "estimated_value": estimated_value,
-                            "keywords": keywords,
-                            "related_patents": related_patents,
-                            "collaboration": collaboration,
-                            "funding_source": funding_source,
-                            "is_on_blockchain": (store_option == "On Blockchain"),
-                            "status": "Pending",
-                            "verification_score": verify_patent_authenticity({
-                                "title": patent_title,
-                                "description": patent_description,
-                                "doc_hash": doc_hash
-                            }),
-                            "created_by": st.session_state.current_user.username,
-                            "file_name": file_name,
-                            "file_size": file_size,
-                            "timestamp": now_iso
-                        }
-
-                        # Store patent
-                        if patent_data["is_on_blockchain"]:
-                            try:
-                                new_block = Block(
-                                    index=len(st.session_state.toy_chain.chain),
-                                    timestamp=now_iso,
-                                    data=patent_data,
-                                    previous_hash=""
-                                )
-                                
-                                st.info("⛏️ Mining block on blockchain...")
-                                time.sleep(0.5)  # Simulate mining time
-                                st.session_state.toy_chain.add_block(new_block)
-
-                                st.session_state.counts_on_chain[patent_type] += 1
-                                add_notification(f"Patent {patent_id} successfully recorded on blockchain!", "success")
-                                
-                                st.success(f"🎉 Patent {patent_id} successfully recorded on the blockchain!")
-                                st.info(f"🔗 Block #{new_block.index} created with hash: {new_block.hash[:16]}...")
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error adding to blockchain: {str(e)}")
-                                st.error("Falling back to off-chain storage...")
-                                # Fallback to off-chain
-                                patent_data["is_on_blockchain"] = False
-                                st.session_state.off_chain_list.append({
-                                    "timestamp": now_iso,
-                                    "data": patent_data
-                                })
-                                st.session_state.counts_off_chain[patent_type] += 1
-                                
-                        else:
-                            try:
-                                st.session_state.off_chain_list.append({
-                                    "timestamp": now_iso,
-                                    "data": patent_data
-                                })
-                                st.session_state.counts_off_chain[patent_type] += 1
-                                add_notification(f"Patent {patent_id} stored off-chain", "info")
-                                st.success(f"📄 Patent {patent_id} stored off-chain successfully!")
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error storing patent: {str(e)}")
-                                st.stop()
-
-                        # Update user stats
-                        st.session_state.current_user.patents_submitted += 1
-
-                        # Show verification score
-                        score = patent_data["verification_score"]
-                        if score >= 80:
-                            st.success(f"🏆 High verification score: {score}/100")
-                        elif score >= 60:
-                            st.info(f"✅ Good verification score: {score}/100")
-                        else:
-                            st.warning(f"⚠️ Low verification score: {score}/100 - Consider adding more details")
-
-                        # Show summary
-                        with st.expander("📋 Submission Summary", expanded=True):
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.write(f"**Patent ID:** {patent_id}")
-                                st.write(f"**Title:** {patent_title}")
-                                st.write(f"**Type:** {patent_type}")
-                                st.write(f"**Priority:** {priority}")
-                            with col2:
-                                st.write(f"**Storage:** {'Blockchain' if patent_data['is_on_blockchain'] else 'Off-Chain'}")
-                                st.write(f"**Status:** {patent_data['status']}")
-                                st.write(f"**Verification Score:** {score}/100")
-                                st.write(f"**Submitted:** {now_iso[:19]}")
-
-                        st.balloons()
-                        
-                except Exception as e:
-                    st.error(f"❌ Unexpected error during submission: {str(e)}")
-                    st.error("Please try again or contact system administrator.")
-                    # Optional: Show technical details for debugging
-                    if st.checkbox("Show technical details"):
-                        st.exception(e)
-
-    with tab2:
-        filters = render_advanced_search()
-
-        # Собираем все патенты
-        all_patents = []
-
-        # Ончейн
-        for block in st.session_state.toy_chain.chain[1:]:  # Skip genesis
-            patent = dict(block.data or {})
-            patent["source"] = "blockchain"
-            patent["block_index"] = block.index
-            patent["hash"] = block.hash
-            # ВАЖНО: timestamp берём из блока, если в data нет
-            patent["timestamp"] = patent.get("timestamp", block.timestamp)
-            all_patents.append(patent)
-
-        # Оффчейн
-        for i, record in enumerate(st.session_state.off_chain_list):
-            patent = dict(record["data"] or {})
-            patent["source"] = "off-chain"
-            patent["record_index"] = i
-            patent["timestamp"] = record["timestamp"]
-            all_patents.append(patent)
-
-        # Фильтры
-        filtered = all_patents
-
-        if filters["search_term"]:
-            q = filters["search_term"].lower()
-            filtered = [
-                p for p in filtered
-                if q in p.get("title", "").lower()
-                or q in p.get("description", "").lower()
-                or q in p.get("inventor", "").lower()
-                or q in p.get("patent_id", "").lower()
-            ]
-
-        if filters["filter_type"] != "All":
-            filtered = [p for p in filtered if p.get("patent_type") == filters["filter_type"]]
-
-        if filters["filter_status"] != "All":
-            filtered = [p for p in filtered if p.get("status") == filters["filter_status"]]
-
-        if filters["priority_filter"]:
-            filtered = [p for p in filtered if p.get("priority") in filters["priority_filter"]]
-
-        if filters["storage_filter"] == "On-Chain":
-            filtered = [p for p in filtered if p.get("is_on_blockchain") is True]
-        elif filters["storage_filter"] == "Off-Chain":
-            filtered = [p for p in filtered if p.get("is_on_blockchain") is False]
-
-        # Даты
-        df_dates = []
-        for p in filtered:
-            try:
-                dt = _parse_iso(p.get("timestamp", datetime.datetime.min.isoformat())).date()
-            except Exception:
-                dt = datetime.date.min
-            df_dates.append((p, dt))
-        filtered = [
-            p for (p, dt) in df_dates
-            if filters["date_from"] <= dt <= filters["date_to"]
-        ]
-
-        # Вывод
-        st.subheader(f"📋 Patent Results ({len(filtered)} found)")
-
-        if filtered:
-            sort_by = st.selectbox("Sort by", ["Newest First", "Oldest First", "Title A-Z", "Verification Score"])
-            if sort_by == "Newest First":
-                filtered.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-            elif sort_by == "Oldest First":
-                filtered.sort(key=lambda x: x.get("timestamp", ""))
-            elif sort_by == "Title A-Z":
-                filtered.sort(key=lambda x: x.get("title", ""))
-            elif sort_by == "Verification Score":
-                filtered.sort(key=lambda x: x.get("verification_score", 0), reverse=True)
-
-            for patent in filtered:
-                created = patent.get('timestamp', '')
-                created_short = created.replace("T", " ")[:19] if created else "Unknown"
-                st.markdown(f"""
-                <div class="patent-card">
-                    <div style="display:flex;justify-content:space-between;align-items:start;gap:16px;">
-                        <div style="flex:1;">
-                            <h4 style="margin:0;">{patent.get('title','Untitled')}</h4>
-                            <p style="margin:4px 0 6px 0;"><strong>ID:</strong> {patent.get('patent_id','N/A')} &nbsp;|&nbsp;
-                               <strong>Type:</strong> {patent.get('patent_type','Unknown')} &nbsp;|&nbsp;
-                               <strong>Inventor:</strong> {patent.get('inventor','Unknown')}</p>
-                            <p style="margin:4px 0 6px 0;"><strong>Description:</strong> {patent.get('description','No description')[:200]}{'...' if len(patent.get('description',''))>200 else ''}</p>
-                            <p style="margin:4px 0 0 0;"><strong>Storage:</strong> {'🔗 Blockchain' if patent.get('is_on_blockchain') else '📁 Off-Chain'} &nbsp;|&nbsp;
-                               <strong>Created:</strong> {created_short}</p>
-                        </div>
-                        <div style="text-align:right;min-width:120px;">
-                            <span class="priority-{patent.get('priority','normal').lower()}">{patent.get('priority','Normal')}</span><br>
-                            <span class="status-{patent.get('status','pending').lower()}">{patent.get('status','Pending')}</span><br>
-                            <small>Score: {patent.get('verification_score',0)}/100</small>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.info("No patents found matching your search criteria.")
-
-    with tab3:
-        render_blockchain_explorer()
-
-    with tab4:
-        render_analytics_dashboard()
-
-    with tab5:
-        export_data()
-
-    with tab6:
-        st.header("⚙️ System Information")
-
-        # Презентабельные системные метрики
-        stats = get_blockchain_stats()
-        m1, m2, m3, m4 = st.columns(4)
-        m1.metric("Blocks", stats["total_blocks"])
-        m2.metric("Chain Valid", "Yes" if stats["chain_valid"] else "No")
-        m3.metric("Avg Block Time", f"{stats['average_block_time']:.2f}s")
-        m4.metric("Hash Power (Σ nonce)", f"{stats['total_hash_power']}")
-
-        # Табличка «как JSON, но красиво»
-        table_data = [
-            ("Blockchain Status", "Active"),
-            ("Total Blocks", stats["total_blocks"]),
-            ("Chain Validity", stats["chain_valid"]),
-            ("Mining Difficulty", st.session_state.toy_chain.difficulty),
-            ("Total Hash Power", stats["total_hash_power"]),
-            ("Average Block Time", f"{stats['average_block_time']:.2f}s"),
-            ("Total Users", len(st.session_state.users)),
-            ("Current User", st.session_state.current_user.username),
-            ("Total Notifications", len(st.session_state.notifications)),
-        ]
-        st.table(pd.DataFrame(table_data, columns=["Metric", "Value"]))
-
-        st.subheader("🔧 System Tools")
-        colA, colB, colC = st.columns(3)
-
-        with colA:
-            if st.button("🔄 Validate Blockchain"):
-                with st.spinner("Validating blockchain integrity..."):
-                    time.sleep(0.3)
-                    is_valid = st.session_state.toy_chain.is_chain_valid()
-                    if is_valid:
-                        st.success("✅ Blockchain is valid!")
-                    else:
-                        st.error("❌ Blockchain validation failed!")
-
-        with colB:
-            if st.button("🧹 Clear Notifications"):
-                st.session_state.notifications = []
-                st.success("Notifications cleared!")
-
-        with colC:
-            if st.button("📊 Generate System Report"):
-                report = {
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "system_stats": get_blockchain_stats(),
-                    "user_count": len(st.session_state.users),
-                    "patent_counts": {
-                        "on_chain": sum(st.session_state.counts_on_chain.values()),
-                        "off_chain": sum(st.session_state.counts_off_chain.values())
-                    }
-                }
-                st.json(report)
-                st.download_button(
-                    "Download Report",
-                    json.dumps(report, indent=2),
-                    file_name=f"system_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
+    # Разделы вместо st.tabs: st.tabs исполняет все шесть вкладок на каждом rerun
+    section = st.radio("Section", list(SECTIONS), horizontal=True, key="section",
+                       label_visibility="collapsed")
+    SECTIONS[section]()
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "node":
+        run_node(sys.argv[2:])
+    else:
+        main()
 
 
 
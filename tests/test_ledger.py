@@ -0,0 +1,89 @@
+import datetime
+import threading
+
+import pytest
+
+import main
+
+
+def open_ledger(data_dir):
+    return main.load_ledger(main.LedgerStore(str(data_dir)), main.PATENT_TYPES)
+
+
+def off_chain_patent(patent_id):
+    now = datetime.datetime.now().isoformat()
+    return {"timestamp": now, "data": {
+        "patent_id": patent_id, "title": "Off-chain widget", "patent_type": "Other",
+        "is_on_blockchain": False, "status": "Pending", "created_by": "demo_user", "timestamp": now,
+    }}
+
+
+def test_off_chain_status_change_survives_reload(tmp_path):
+    ledger = open_ledger(tmp_path)
+    main.store_off_chain(ledger, off_chain_patent("PAT-OFF1"))
+    main.change_status(ledger, "PAT-OFF1", "Approved", main.User("examiner1", "Examiner"))
+
+    reloaded = open_ledger(tmp_path)
+    assert reloaded["catalog"]["PAT-OFF1"]["status"] == "Approved"
+    assert "PAT-OFF1" in reloaded["status_queues"]["Approved"]
+    with pytest.raises(ValueError):
+        main.change_status(reloaded, "PAT-OFF1", "Approved", main.User("examiner1", "Examiner"))
+
+
+def test_checkpoint_waits_for_off_chain_append(tmp_path, monkeypatch):
+    ledger = open_ledger(tmp_path)
+    store = ledger["store"]
+    append_off_chain = store.append_off_chain
+    checkpointer = []
+
+    def append_then_race(record):
+        append_off_chain(record)
+        # чекпоинт из другого потока посреди store_off_chain
+        thread = threading.Thread(target=main.write_checkpoint, args=(ledger,))
+        thread.start()
+        thread.join(timeout=0.2)
+        checkpointer.append(thread)
+
+    monkeypatch.setattr(store, "append_off_chain", append_then_race)
+    main.store_off_chain(ledger, off_chain_patent("PAT-OFF2"))
+    checkpointer[0].join()
+
+    reloaded = open_ledger(tmp_path)
+    assert reloaded["status"]["checkpoint_height"] == 0
+    assert reloaded["catalog"]["PAT-OFF2"]["source"] == "off-chain"
+    assert reloaded["counts_off_chain"]["Other"] == 1
+
+
+def test_average_block_time_skips_genesis(tmp_path):
+    ledger = open_ledger(tmp_path)
+    main.seed_ledger(ledger, 5)
+    stats = main._compute_blockchain_stats(ledger)
+    # генезис датирован 2024-01-01 — без пропуска среднее было бы ~1e7 с
+    assert stats["average_block_time"] < 24 * 3600
+
+
+def test_memo_survives_concurrent_clear(tmp_path):
+    class ClearedByOtherSession(dict):
+        def __setitem__(self, key, value):
+            super().__setitem__(key, value)
+            self.clear()   # другой поток упёрся в MEMO_LIMIT
+
+    ledger = open_ledger(tmp_path)
+    ledger["memo"] = {"version": main.ledger_version(ledger), "values": ClearedByOtherSession()}
+    assert main.memoize_on_version(ledger, "answer", lambda: 42) == 42
+
+
+def test_failing_subscriber_is_logged_and_kept(caplog):
+    bus = main.EventBus()
+
+    def broken_index(event):
+        raise KeyError("patent_id")
+
+    bus.subscribe(main.EVENT_MINED, broken_index)
+    bus.subscribe(main.EVENT_MINED, lambda event: event.setdefault("seen", True))
+    with caplog.at_level("ERROR", logger="patentchain"):
+        event = bus.publish(main.EVENT_MINED, data={})
+
+    assert event["seen"]
+    assert "broken_index" in caplog.text
+    assert "broken_index: KeyError('patent_id')" in bus.errors[0]
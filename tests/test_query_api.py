@@ -0,0 +1,48 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def api(tmp_path):
+    ledger = main.load_ledger(main.LedgerStore(str(tmp_path)), main.PATENT_TYPES)
+    main.seed_ledger(ledger, 5)
+    api = main.QueryAPI(ledger, "127.0.0.1", 0).start()
+    yield api
+    api.stop()
+
+
+def request(url, body=None, headers=None):
+    data = None if body is None else body.encode()
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+@pytest.mark.parametrize("body", ["[1, 2]", '"PAT-1"', "3"])
+def test_post_non_object_body_is_rejected(api, body):
+    status, _, payload = request(api.url + "/patents", body)
+    assert status == 400
+    assert json.loads(payload)["error"] == "expected a JSON object"
+
+
+def test_post_batch_lookup(api):
+    patent_id = next(iter(api.ledger["catalog"]))
+    status, _, payload = request(api.url + "/patents", json.dumps({"ids": [patent_id, "PAT-NOPE"]}))
+    rows = [json.loads(line) for line in payload.splitlines()]
+    assert status == 200
+    assert rows[0]["patent_id"] == patent_id and rows[1]["error"] == "not found"
+
+
+def test_search_honours_etag(api):
+    status, headers, payload = request(api.url + "/search?limit=2")
+    assert status == 200 and len(payload.splitlines()) == 2
+    status, _, _ = request(api.url + "/search?limit=2", headers={"If-None-Match": headers["ETag"]})
+    assert status == 304
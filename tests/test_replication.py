@@ -0,0 +1,111 @@
+import datetime
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def make_node(tmp_path):
+    """LedgerNode on an ephemeral port over a fresh ledger in its own directory"""
+    nodes = []
+
+    def make(name, peers=()):
+        ledger = main.load_ledger(main.LedgerStore(str(tmp_path / name)), main.PATENT_TYPES)
+        node = main.LedgerNode(ledger, "127.0.0.1", 0, [peer.url for peer in peers]).start()
+        nodes.append(node)
+        return node
+
+    yield make
+    for node in nodes:
+        node.stop()
+
+
+def mine(node, patent_id, owner="demo_user"):
+    data = {"patent_id": patent_id, "title": f"Invention {patent_id}", "patent_type": "Utility Patent",
+            "status": "Pending", "created_by": owner, "is_on_blockchain": True}
+    return main.mine_patent(node.ledger, data, datetime.datetime.now().isoformat())
+
+
+def tip(node):
+    return node.blockchain.get_latest_block().hash
+
+
+def test_new_node_catches_up_headers_first(make_node):
+    a = make_node("a")
+    main.seed_ledger(a.ledger, 30)
+    b = make_node("b", peers=[a])
+
+    assert b.sync_all() == 30
+    assert tip(b) == tip(a)
+    assert b.blockchain.is_chain_valid(full=True)
+    assert set(b.ledger["catalog"]) == set(a.ledger["catalog"])
+    assert b.ledger["counts_on_chain"] == a.ledger["counts_on_chain"]
+
+
+def test_fork_resolves_to_most_work(make_node):
+    a, b, c = make_node("a"), make_node("b"), make_node("c")
+    for i in range(2):
+        mine(a, f"PAT-A{i}")
+    for i in range(4):
+        mine(b, f"PAT-B{i}")
+    c.peers = [a.url, b.url]
+
+    # c догоняет a, затем переходит на более тяжёлую ветку b
+    assert c.sync_from(a.url) == 2
+    assert c.sync_from(b.url) == 4
+    assert c.blockchain.chain[4].hash == tip(b)
+    # патенты a, выпавшие при реорге, перемайнены поверх ветки b
+    assert set(c.ledger["catalog"]) == {"PAT-A0", "PAT-A1", "PAT-B0", "PAT-B1", "PAT-B2", "PAT-B3"}
+    # более лёгкая ветка не принимается
+    assert b.sync_from(a.url) == 0
+    assert tip(b) != tip(a)
+
+
+def test_reorg_remines_dropped_patents_and_status_changes(make_node):
+    a, b = make_node("a"), make_node("b")
+    for i in range(4):
+        mine(a, f"PAT-A{i}")
+    mine(b, "PAT-B0", owner="bob")
+    main.change_status(b.ledger, "PAT-B0", "Approved", main.User("examiner1", "Examiner"))
+
+    assert b.sync_from(a.url) == 4
+    assert b.last_sync["dropped"] == 2 and b.last_sync["remined"] == 2
+    record = main.get_patent_record(b.ledger, "PAT-B0")
+    assert record["status"] == "Approved"
+    assert record["block_index"] > 4
+    assert all(pid in b.ledger["catalog"] for pid in a.ledger["catalog"])
+    assert b.blockchain.is_chain_valid(full=True)
+    messages = [item["message"] for item in main.get_inbox(b.ledger, "bob").latest()]
+    assert any("re-recorded" in message for message in messages)
+
+
+def test_remine_dropped_skips_patents_present_in_new_branch(make_node):
+    a = make_node("a")
+    block = mine(a, "PAT-KEEP")
+    height = len(a.blockchain.chain)
+
+    assert main.remine_dropped(a.ledger, [block]) == []
+    assert len(a.blockchain.chain) == height
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("GET", "/bodies?from=x", None),
+    ("GET", "/bodies?count=many", None),
+    ("POST", "/headers", "[1, 2]"),
+    ("POST", "/headers", '{"locator": "abc"}'),
+    ("POST", "/headers", '{"locator": [], "count": "x"}'),
+    ("POST", "/headers", '{"locator": [[1]]}'),
+    ("POST", "/announce", '{"url": 5}'),
+    ("POST", "/announce", '{"url": "http://127.0.0.1:1", "total_work": "lots"}'),
+])
+def test_malformed_requests_get_400(make_node, method, path, body):
+    node = make_node("a")
+    req = urllib.request.Request(node.url + path, data=body.encode() if body else None, method=method)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(req, timeout=5)
+    assert error.value.code == 400
+    assert "error" in json.loads(error.value.read())